@@ -0,0 +1,55 @@
+# POSITION RANKING AND PORTFOLIO ALLOCATION FOR MARKET CORRECTION STRATEGIES
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+import math
+import numpy as np
+
+
+# FUNCTION TO RANK SYMBOLS WITH A POSITIVE POTENTIAL GAIN FROM HIGHEST TO LOWEST GAIN
+# symbols with equal gains keep their list order so each symbol appears in the ranking once
+def rank_positions(potential_gains, indices):
+
+    gains = np.asarray(potential_gains, dtype=float)
+    candidates = np.flatnonzero(gains > 0)  # list indices of symbols with sufficient gain
+    ranked_symbol_indices = candidates[np.argsort(-gains[candidates], kind='mergesort')].tolist()  # stable sort by gain
+    ranked_symbols = [indices[ranked_symbol_index] for ranked_symbol_index in ranked_symbol_indices]  # symbols in rank order
+
+    return ranked_symbols, ranked_symbol_indices  # return the ranked symbols and their associated list indices
+
+
+# FUNCTION TO ALLOCATE SHARES BY CYCLING THROUGH A RANKING BUYING ONE SHARE OF EACH AFFORDABLE SYMBOL PER CYCLE
+# Gives the same shares as buying one share per loop iteration until value drops below the cheapest price, but
+# whole cycles of the ranking are bought at once so the number of python iterations does not grow with value
+def allocate_shares(ranked_prices, value):
+
+    costs = [math.ceil(price) for price in ranked_prices]  # value taken away for each share
+    shares = [0 for _ in ranked_prices]  # initialise number of shares for each position in ranking
+    min_price = min(ranked_prices)
+
+    while value > min_price:  # while the cheapest symbol can be bought
+
+        # symbols which can be afforded stay affordable for every whole cycle that leaves value above zero
+        affordable = [i for i, price in enumerate(ranked_prices) if price < value]
+        cycle_cost = sum([costs[i] for i in affordable])
+        cycles = math.ceil(value / cycle_cost) - 1  # number of whole cycles leaving value above zero
+
+        if cycles > 0 and value - cycles * cycle_cost <= 0:  # correct for rounding in division
+            cycles -= 1
+
+        if cycles > 0:  # buy whole cycles of the ranking at once
+            for i in affordable:
+                shares[i] += cycles
+            value -= cycles * cycle_cost
+
+        # go through the ranking once more one share at a time (drops any symbols which become unaffordable)
+        for i, price in enumerate(ranked_prices):
+
+            if value <= min_price:  # stop when the cheapest symbol can no longer be bought
+                break
+
+            if price < value:  # determine if the price is less than our current disposable value
+                shares[i] += 1  # add one to order
+                value -= costs[i]  # take away price from value
+
+    return shares  # return the shares for each position in ranking
@@ -4,10 +4,8 @@
 
 import zipline
 import pandas as pd
-import pandas_datareader.data as web
 import datetime as dt
 import os
-import fix_yahoo_finance
 import pytz
 from collections import OrderedDict
 import shutil
@@ -17,53 +15,59 @@ import strategy_single_position
 import strategy_multiple_positions
 import strategy_multiple_positions_Counter
 import pickle
+import signals
+import profiling
+import result_cache
+import index_data
+import price_cache
+import data_cleaning
+import world_indices_bundle
 
 
-fix_yahoo_finance.pdr_override()  # override DataReader function (yahoo finance fix)
+# FUNCTION TO GENERATE OR UPDATE FOLDER OF CSV FILES FOR YAHOO MAJOR WORLD INDICES
+# tickers are fetched concurrently and only days after the last date in each csv file are downloaded (see index_data)
+def get_index_data(tickers, start, end, csv_directory, provider=None):
 
-
-# FUNCTION TO GENERATE FOLDER OF CSV FILES FOR YAHOO MAJOR WORLD INDICES
-def get_index_data(tickers, start, end, csv_directory):
-
-    os.mkdir(csv_directory)  # create folder for index data
-
-    # Save ticker data to .csv files
-    for ticker in tickers:
-        # attempt to get ticker data from yahoo
-        try:
-            # get ticker data from Yahoo finance
-            ticker_data = web.get_data_yahoo(ticker, start, end)
-            ticker_data.to_csv(csv_directory + '{}.csv'.format(ticker))  # save data to csv
-            print(ticker)  # print ticker when data is saved
-        except:
-            print('Error fetching data from yahoo for {}'.format(ticker))
+    return index_data.update_index_data(tickers, start, end, csv_directory, provider)
 
 
 # FUNCTION TO FORMAT DATA FOR ZIPLINE BACKTEST
-def format_data(indices_tickers):
+# if refresh is True the days since the index data was last saved are downloaded first
+def format_data(indices_tickers, refresh=False, csv_directory='World_indices_data/'):
 
     indices_data = OrderedDict()  # initialize dictionary to store dataframes for each ticker
 
-    # if index data is not already saved locally, get it for corresponding time frame
-    csv_directory = 'World_indices_data/'
-    if not os.path.exists(csv_directory):
+    # if index data is not already saved locally (or is being refreshed), get it for corresponding time frame
+    if not os.path.exists(csv_directory) or refresh:
         get_index_data(indices_tickers, dt.datetime(1985, 1, 1), dt. datetime.now(),
                        csv_directory)  # set time frame for data here
     else:
         print('Indices data folder already exists')
 
-    # organise ticker data to open-high-low-close-volume
-    for ticker in indices_tickers:
-        indices_data[ticker] = pd.read_csv(csv_directory + '{}.csv'.format(ticker), index_col=0, parse_dates=['Date'])  # read csv file
-        indices_data[ticker] = indices_data[ticker][['Open', 'High', 'Low', 'Close', 'Volume']]  # swap columns to DateOHLCV
+    if price_cache.enabled:  # load cleaned prices from binary cache (rebuilt from the csv files if they have changed)
+
+        prices = price_cache.load(indices_tickers, csv_directory)
+        values = prices['prices']  # tickers x dates x OHLCV array (memory mapped, not copied)
+        dates = prices['dates']
+
+    else:
+
+        # organise ticker data to open-high-low-close-volume
+        for ticker in indices_tickers:
+            indices_data[ticker] = pd.read_csv(csv_directory + '{}.csv'.format(ticker), index_col=0, parse_dates=['Date'])  # read csv file
+            indices_data[ticker] = indices_data[ticker][['Open', 'High', 'Low', 'Close', 'Volume']]  # swap columns to DateOHLCV
+
+        panel = pd.Panel(indices_data)  # align tickers on the dates of all tickers
+        values = panel.values.astype(float)  # tickers x dates x OHLCV array
+        dates = panel.major_axis
 
-        # Correct for instances of zero volume
-        for i, vol in enumerate(indices_data[ticker]['Volume']):
-            if vol <= 0:  # if the volume value is 0 or negative
-                indices_data[ticker].loc[indices_data[ticker].index[i], 'Volume'] = 10000000  # amend volume
+        # clean missing prices, price spikes, inconsistent highs and lows and zero volumes (see data_cleaning)
+        report = data_cleaning.clean_data(values, indices_tickers, **price_cache.cleaning)  # same cleaning as the price cache
+        if report.values.sum() > 0:
+            print('Days cleaned:')
+            print(report[report.sum(axis=1) > 0])
 
-    panel = pd.Panel(indices_data)  # create 'data panel' (3D dataframe)
-    panel.minor_axis = ['open', 'high', 'low', 'close', 'volume']  # set minor axis headers to OHLCV
+    panel = pd.Panel(values, items=indices_tickers, major_axis=dates, minor_axis=['open', 'high', 'low', 'close', 'volume'])  # create 'data panel' (3D dataframe)
     panel.major_axis = panel.major_axis.tz_localize(pytz.utc)  # localise time on major axis to UTC zone
 
     return panel  # return data panel
@@ -84,6 +88,12 @@ if __name__ == '__main__':
     panel = format_data(indices_tickers)  # format data for zipline backtest
     print('Data formatted for Zipline')
 
+    strategy_module = strategy_multiple_positions_Counter  # strategy to backtest
+
+    if strategy_module is strategy_multiple_positions:  # signals are only read in by strategy_multiple_positions
+        signals.save_signals(panel, indices_tickers, 'signals.pickle')  # calculate signals for strategy_multiple_positions
+        print('Signals calculated')
+
     '''------------------------------------ RUN BACKTEST ------------------------------------'''
     start = dt.datetime(2000, 1, 1, 0, 0, 0, 0, pytz.utc)  # start of backtest
     end = dt.datetime(2019, 12, 31, 0, 0, 0, 0, pytz.utc)  # end of backtest
@@ -100,20 +110,47 @@ if __name__ == '__main__':
         shutil.rmtree(backtest_directory)  # delete backtest
         os.mkdir(backtest_directory)  # creates backtest folder
 
-    timer = time.time()  # initialise timer
+    use_bundle = False  # backtest against the ingested world indices bundle instead of the data panel
+    data_source = {'bundle': world_indices_bundle.bundle_name} if use_bundle else {'data': panel}  # data to test against
 
-    performance = zipline.run_algorithm(start=start,  # start
-                                        end=end,  # end
-                                        initialize=strategy_multiple_positions_Counter.initialize,  # initialize function
-                                        capital_base=initial_capital,  # initial capital
-                                        handle_data=strategy_multiple_positions_Counter.handle_market_corrections,  # handle_data function
-                                        data=panel)  # data to test against
+    profile_strategy = False  # time the phases of the strategy on each bar (saved to profile.csv)
+    if profile_strategy:
+        profiling.enable()
 
-    print('SIMULATION TIME : ' + str(dt.timedelta(seconds=round((time.time() - timer), 0))))  # print elapsed time
+    # check if the strategy has already been backtested over the timeframe and capital base (the strategy is run if profiling)
+    strategy = result_cache.strategy_fingerprint([strategy_module] + result_cache.strategy_modules())  # modules the backtest runs
+    strategy += ';' + result_cache.pipeline_fingerprint() + (';bundle' if use_bundle else '')  # data pipeline
+    cache_key = result_cache.make_key(strategy, {}, start, end, initial_capital, indices_tickers)
+    performance = result_cache.load(cache_key) if not profile_strategy else None
+
+    if performance is None:
+
+        timer = time.time()  # initialise timer
+
+        performance = zipline.run_algorithm(start=start,  # start
+                                            end=end,  # end
+                                            initialize=strategy_module.initialize,  # initialize function
+                                            capital_base=initial_capital,  # initial capital
+                                            handle_data=strategy_module.handle_market_corrections,  # handle_data function
+                                            **data_source)
+
+        print('SIMULATION TIME : ' + str(dt.timedelta(seconds=round((time.time() - timer), 0))))  # print elapsed time
+
+        result_cache.save(cache_key, performance)  # cache backtest for reruns
+
+    else:
+        print('Backtest loaded from result cache')
+        os.remove('tickers.pickle')  # delete tickers pickle file (otherwise deleted by initialize)
+
+    if os.path.exists('signals.pickle'):  # not deleted by initialize if the backtest was loaded from the result cache
+        os.remove('signals.pickle')  # delete signals pickle file
 
     backtest_spreadsheet = 'spreadsheet.csv'
     performance.to_csv(backtest_directory + backtest_spreadsheet)  # save backtest results to csv
     performance.to_pickle(backtest_directory + 'backtest.pickle')  # pickle backtest dataframe
     print('Backtest saved to CSV file: ' + backtest_spreadsheet)
 
+    if profile_strategy:
+        profiling.dump(backtest_directory)  # save phase times next to the spreadsheet
+
     analysis.backtest_analysis(backtest=performance, start=start.date(), end=end.date(), capital=initial_capital)  # run analysis on backtest
\ No newline at end of file
@@ -0,0 +1,105 @@
+# APPEND ONLY CHECKPOINT LOG OF OPTIMISATION RESULTS
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Each evaluation is appended to the log as one line of JSON, e.g.
+# {"parameters": {...}, "mean_daily_return": 0.0004, "alpha": 0.1, "start": "2000-01-01", "end": "2019-12-31"}
+# The log is flushed to disk (fsync) every sync_every records and when it is closed, so at most sync_every - 1
+# evaluations are lost if the optimisation is killed. read_log() reads the records back to resume an optimisation.
+
+import os
+import json
+
+
+# APPEND ONLY LOG OF EVALUATIONS
+class CheckpointLog:
+
+    def __init__(self, path, sync_every=10):
+
+        self.path = path
+        self.sync_every = sync_every  # number of records between writes to disk
+        remove_partial_record(path)  # new records must not be appended to a partly written last line
+        self.handle = open(path, 'a')
+        self.no_of_unsynced = 0  # number of records not yet written to disk
+
+    # FUNCTION TO APPEND A RECORD TO THE LOG
+    def write(self, record):
+
+        self.handle.write(json.dumps(record) + '\n')
+        self.no_of_unsynced += 1
+
+        if self.no_of_unsynced >= self.sync_every:
+            self.sync()
+
+    # FUNCTION TO WRITE THE RECORDS TO DISK
+    def sync(self):
+
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.no_of_unsynced = 0
+
+    # FUNCTION TO WRITE THE REMAINING RECORDS TO DISK AND CLOSE THE LOG
+    def close(self):
+
+        self.sync()
+        self.handle.close()
+
+
+# FUNCTION TO TRUNCATE A LOG AFTER ITS LAST COMPLETE LINE (removes a record only partly written when a run was killed)
+def remove_partial_record(path):
+
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb+') as handle:
+        contents = handle.read()
+        if len(contents) > 0 and not contents.endswith(b'\n'):
+            handle.truncate(contents.rfind(b'\n') + 1)  # 0 if there is no complete line
+
+
+# FUNCTION TO READ THE RECORDS OF A LOG (an empty list if there is no log)
+def read_log(path):
+
+    records = []
+
+    if not os.path.exists(path):
+        return records
+
+    with open(path, 'r') as handle:
+        for line in handle:
+            try:
+                records.append(json.loads(line))
+            except ValueError:  # line was only partly written
+                continue
+
+    return records
+
+
+# FUNCTION TO CHECK THE RECORDS OF A LOG WERE WRITTEN WITH THE SAME PRUNING SETTING AS THE OPTIMISATION RESUMING IT
+# (records of optimisations with pruning have 'pruned' and 'checkpoint_returns' fields, so results with and without
+# pruning have different columns and can not be mixed)
+def check_pruning(records, pruning):
+
+    for record in records:
+        if ('pruned' in record) != pruning:
+            raise ValueError('Checkpoint log was written ' + ('without' if pruning else 'with') + ' pruning - resume it '
+                             'with the same pruning setting or start a new checkpoint file')
+
+
+# FUNCTION TO CREATE A RECORD OF AN EVALUATION
+def make_record(parameters, mean_daily_return, alpha, start, end, **extra):
+
+    record = {'parameters': {key: float(value) for key, value in parameters.items()},
+              'mean_daily_return': float(mean_daily_return),
+              'alpha': float(alpha),
+              'start': str(start.date()),
+              'end': str(end.date())}
+    record.update(extra)
+
+    return record
+
+
+# FUNCTION TO IDENTIFY A PARAMETER SET IN A LOG
+def parameters_key(parameters):
+
+    return json.dumps({key: round(float(value), 10) for key, value in parameters.items()}, sort_keys=True)
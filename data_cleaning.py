@@ -0,0 +1,106 @@
+# CLEANING OF INDEX DATA BEFORE BACKTESTING
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# clean_data() cleans a tickers x dates x OHLCV array (see backtest.format_data) in place, one whole array operation
+# per step:
+#   1. days with a missing open, high, low or close price are dropped (set to nan) or forward filled
+#   2. single day spikes in the close price (a move of more than max_spike which is reversed the next day) are clipped
+#      to the range of the closes either side of them
+#   3. highs below and lows above the other prices of the day are set to the highest and lowest price of the day
+#   4. zero or negative volumes are set to 10000000
+# and returns a dataframe of the number of days changed by each step for each ticker.
+# Days on which a ticker has no data at all (all nan after aligning the tickers) are left as they are.
+# The prices are cleaned when the price cache is built with the arguments in price_cache.cleaning - changing them or
+# this file rebuilds the cache (see price_cache.cleaning_fingerprint).
+
+import numpy as np
+import pandas as pd
+
+
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)  # positions of the fields in the last axis of the array
+
+
+# FUNCTION TO GET THE POSITION OF THE LAST VALID VALUE BEFORE AND THE NEXT VALID VALUE AFTER EACH DAY
+# (-1 if there is no value before, no_of_days if there is no value after)
+def get_neighbours(valid):
+
+    no_of_days = valid.shape[1]
+    days = np.arange(no_of_days)
+
+    last_valid = np.maximum.accumulate(np.where(valid, days, -1), axis=1)  # last valid day on or before each day
+    next_valid = np.minimum.accumulate(np.where(valid, days, no_of_days)[:, ::-1], axis=1)[:, ::-1]  # next valid day on or after
+
+    previous_days = np.concatenate([np.full((len(valid), 1), -1), last_valid[:, :-1]], axis=1)
+    next_days = np.concatenate([next_valid[:, 1:], np.full((len(valid), 1), no_of_days)], axis=1)
+
+    return previous_days, next_days
+
+
+# FUNCTION TO READ THE VALUES OF A TICKERS x DATES ARRAY AT A TICKERS x DATES ARRAY OF DAY POSITIONS (nan if out of range)
+def take_days(values, days):
+
+    rows = np.arange(len(values))[:, np.newaxis]
+    in_range = (days >= 0) & (days < values.shape[1])
+
+    return np.where(in_range, values[rows, np.clip(days, 0, values.shape[1] - 1)], np.nan)
+
+
+# FUNCTION TO CLEAN A TICKERS x DATES x OHLCV ARRAY IN PLACE - RETURNS NUMBER OF DAYS CHANGED BY EACH STEP FOR EACH TICKER
+# nan_prices is 'drop' or 'ffill', max_spike is the largest log return of a reversed move kept (None to keep all)
+def clean_data(values, tickers, nan_prices='drop', max_spike=0.25, default_volume=10000000):
+
+    report = pd.DataFrame(0, index=list(tickers), columns=['nan_prices', 'spikes', 'ohlc', 'volume'])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+
+        has_data = ~np.all(np.isnan(values), axis=2)  # days on which each ticker has data
+
+        # 1. DAYS WITH MISSING PRICES
+        missing = has_data & np.any(np.isnan(values[:, :, :VOLUME]), axis=2)
+        report['nan_prices'] = missing.sum(axis=1)
+
+        if nan_prices == 'drop':
+            values[missing] = np.nan
+            has_data &= ~missing
+        elif nan_prices == 'ffill':  # copy missing prices from the last day with the price
+            for field in [OPEN, HIGH, LOW, CLOSE]:
+                field_values = values[:, :, field]
+                previous_days, next_days = get_neighbours(~np.isnan(field_values))
+                fill = missing & np.isnan(field_values)
+                field_values[fill] = take_days(field_values, previous_days)[fill]
+        else:
+            raise ValueError('nan_prices must be drop or ffill')
+
+        # 2. SINGLE DAY SPIKES IN THE CLOSE PRICE
+        if max_spike is not None:
+
+            closes = values[:, :, CLOSE]
+            valid = ~np.isnan(closes)
+            previous_days, next_days = get_neighbours(valid)
+            previous_closes = take_days(closes, previous_days)
+            next_closes = take_days(closes, next_days)
+
+            moves = np.log(closes/previous_closes)  # move into each day
+            reversals = np.log(next_closes/closes)  # move out of each day
+            spikes = valid & (np.abs(moves) > max_spike) & (np.abs(reversals) > max_spike) & (np.sign(moves) != np.sign(reversals))
+            report['spikes'] = spikes.sum(axis=1)
+
+            lowest = np.fmin(previous_closes, next_closes)[spikes][:, np.newaxis]
+            highest = np.fmax(previous_closes, next_closes)[spikes][:, np.newaxis]
+            values[:, :, :VOLUME][spikes] = np.clip(values[:, :, :VOLUME][spikes], lowest, highest)
+
+        # 3. INCONSISTENT HIGHS AND LOWS
+        highest = np.fmax.reduce(values[:, :, :VOLUME], axis=2)  # highest price of each day (ignoring nan)
+        lowest = np.fmin.reduce(values[:, :, :VOLUME], axis=2)  # lowest price of each day (ignoring nan)
+        inconsistent = has_data & ((values[:, :, HIGH] < highest) | (values[:, :, LOW] > lowest))
+        report['ohlc'] = inconsistent.sum(axis=1)
+        values[:, :, HIGH][inconsistent] = highest[inconsistent]
+        values[:, :, LOW][inconsistent] = lowest[inconsistent]
+
+        # 4. ZERO OR NEGATIVE VOLUMES
+        no_volume = values[:, :, VOLUME] <= 0
+        report['volume'] = no_volume.sum(axis=1)
+        values[:, :, VOLUME][no_volume] = default_volume
+
+    return report
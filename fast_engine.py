@@ -0,0 +1,433 @@
+# FAST SIMULATION ENGINE FOR MARKET CORRECTION STRATEGIES
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Runs the strategy_multiple_positions and strategy_single_position logic on precomputed signal arrays without
+# zipline. Orders placed on a day are filled in full at the close of the next day the index trades (as zipline does for
+# daily data with the no slippage model set by the optimize initialize functions), commission is charged per order,
+# and positions and cash are tracked to give the 'returns', 'portfolio_value' and 'alpha' columns used by the
+# optimisers. Zipline remains the final check for the best parameter sets - see check_parity at the bottom of this
+# file, which is run on a small fixed dataset by tests/test_fast_engine.py.
+
+import os
+import numpy as np
+import pandas as pd
+import signals
+import rolling_extremum
+import strategy_multiple_positions
+import strategy_single_position
+
+
+# STAND-IN FOR THE ZIPLINE PORTFOLIO
+class Portfolio:
+
+    def __init__(self, capital_base, no_of_indices):
+
+        self.cash = capital_base  # cash available
+        self.positions = np.zeros(no_of_indices, dtype=int)  # number of shares held of each index
+        self.portfolio_value = capital_base  # cash plus value of positions
+
+
+# STAND-IN FOR THE ZIPLINE ALGORITHM CONTEXT
+class Context:
+
+    def __init__(self, indices, portfolio, parameters):
+
+        self.indices = indices  # list indices of each ticker
+        self.portfolio = portfolio
+
+        for key, value in parameters.items():  # parameters are read from context the same as in the strategies
+            setattr(self, key, value)
+
+
+# STAND-IN FOR THE ZIPLINE BLOTTER - ORDERS ARE FILLED AT THE CLOSE OF THE NEXT DAY THE INDEX TRADES
+# (whole orders at the close price, the same as zipline with slippage.FixedSlippage(spread=0.0))
+class Broker:
+
+    def __init__(self, portfolio, commission):
+
+        self.portfolio = portfolio
+        self.commission = commission  # function of the number of shares ordered
+        self.open_orders = []  # [index, amount] of orders waiting to be filled
+
+    # FUNCTION TO PLACE AN ORDER
+    def order(self, index, amount):
+
+        if amount != 0:  # zipline ignores orders for zero shares
+            self.open_orders.append((index, amount))
+
+    # FUNCTION TO PLACE AN ORDER FOR A PERCENTAGE OF PORTFOLIO VALUE (zipline order_target_percent)
+    def order_target_percent(self, index, target, price):
+
+        amount = self.portfolio.portfolio_value * target / price - self.portfolio.positions[index]  # shares to reach target
+
+        if abs(amount - round(amount)) <= 0.0001:  # round amounts within 0.0001 of a whole share like zipline
+            amount = round(amount)
+
+        self.order(index, int(amount))
+
+    # FUNCTION TO GET THE INDICES WITH OPEN ORDERS (zipline get_open_orders)
+    def open_assets(self):
+
+        return [index for index, _ in self.open_orders]
+
+    # FUNCTION TO FILL OPEN ORDERS FOR INDICES WHICH HAVE TRADED TODAY
+    def fill(self, prices, traded):
+
+        waiting = []  # orders which could not be filled today
+
+        for index, amount in self.open_orders:
+            if traded[index]:
+                self.portfolio.positions[index] += amount
+                self.portfolio.cash -= amount * prices[index] + self.commission(amount)
+            else:
+                waiting.append((index, amount))
+
+        self.open_orders = waiting
+
+    # FUNCTION TO REVALUE THE PORTFOLIO AT TODAYS PRICES
+    def update_portfolio_value(self, prices):
+
+        held = self.portfolio.positions != 0
+        self.portfolio.portfolio_value = self.portfolio.cash + np.sum(self.portfolio.positions[held] * prices[held])
+
+        return self.portfolio.portfolio_value
+
+
+# COMMISSION FUNCTIONS
+def per_trade(cost):
+
+    return lambda amount: cost  # zipline commission.PerTrade
+
+
+def per_share(cost, min_trade_cost=0.0):
+
+    return lambda amount: max(abs(amount) * cost, min_trade_cost)  # zipline commission.PerShare
+
+
+# FUNCTION TO LOAD PRICES AND SIGNALS FROM THE DATA PANEL ONCE FOR ALL SIMULATIONS
+def load_market(panel, tickers, bar_days=500):
+
+    closes = signals.get_close_matrix(panel, tickers)  # close prices on the trading calendar
+    market = signals.compute_signals(closes.ffill(), bar_days)  # signals which do not depend on parameters
+    market['traded'] = closes.notnull().values  # days on which each index has a bar (orders can only fill then)
+
+    return market
+
+
+# FUNCTION TO SELECT THE ROWS OF THE MARKET ARRAYS BETWEEN TWO ROW NUMBERS
+def slice_market(market, first, last):
+
+    market_slice = {}
+
+    for key, value in market.items():
+        if isinstance(value, np.ndarray) or isinstance(value, pd.Index):
+            market_slice[key] = value[first:last]
+        else:
+            market_slice[key] = value
+
+    return market_slice
+
+
+# FUNCTION TO CALCULATE ANNUALISED ALPHA AGAINST THE BENCHMARK (empyrical.alpha_beta_aligned as used by zipline)
+def calculate_alpha(returns, benchmark_returns, annualization=252):
+
+    independent = np.where(np.isnan(returns), np.nan, benchmark_returns)
+    residual = independent - np.nanmean(independent)
+    beta = np.nanmean(residual * returns) / np.nanmean(residual ** 2)
+
+    alpha = np.nanmean(returns - beta * benchmark_returns)
+
+    return (alpha + 1) ** annualization - 1
+
+
+# ONE DAY OF STRATEGY_MULTIPLE_POSITIONS
+def multiple_positions_day(context, broker, market, day):
+
+    # lists of upturning indices, indices considered for ordering, peaks and todays prices
+    upturns = context.upturns[day].tolist()
+
+    # if there exists at least one upturning index and no open orders
+    if max(upturns) > 0 and len(broker.open_orders) == 0:
+
+        prices = market['prices'][day].tolist()
+        peaks = market['peaks'][day].tolist()
+        consider = context.consider[day].tolist()
+        no_of_shares = context.portfolio.positions.tolist()
+
+        stack = strategy_multiple_positions.stack_portfolio(peaks, prices, upturns, context, consider)  # determine optimal stack
+        orders = [shares - no_of_shares[i] for i, shares in enumerate(stack)]  # determine the order amounts
+
+        for i, order in enumerate(orders):  # execute sells
+            if order < 0:
+                broker.order(i, order)
+
+        for i, order in enumerate(orders):  # execute buys
+            if order > 0:
+                broker.order(i, order)
+
+
+# ONE DAY OF STRATEGY_SINGLE_POSITION
+def single_position_day(context, broker, market, day):
+
+    prices_today = market['prices'][day]
+    peaks_today = market['peaks'][day]
+    days_of_correction = context.days_of_correction
+
+    # troughs of the last days_of_correction prices including today (the window grows by one day while correcting)
+    troughs_today = np.where(days_of_correction == 1, prices_today, np.fmin(context.troughs, prices_today))
+    troughs_today[days_of_correction == 0] = -1
+    context.troughs = troughs_today
+
+    prices = prices_today.tolist()
+    peaks = peaks_today.tolist()
+    troughs = troughs_today.tolist()
+    no_of_shares = context.portfolio.positions.tolist()
+
+    if sum(no_of_shares) > 0:  # if we have an open position
+        # update peak price of investment (peak of the last days_since_investment prices) with todays price
+        context.investment_extremum.update(prices[context.bought_list_index], window=context.days_since_investment)
+        peak_investment_price = context.investment_extremum.peak
+
+    # identify correcting indices and update the days since corrections
+    with np.errstate(invalid='ignore'):
+        correcting = (prices_today <= peaks_today*(1-context.min_gain)) & (troughs_today <= (1-context.correction_margin)*peaks_today)
+    context.days_of_correction = np.where(correcting, days_of_correction + 1, 0)
+
+    # identify increase from trough of correction
+    upturns = [(prices[i]-troughs[i])/troughs[i] if troughs[i] > 0 and prices[i] >= strategy_single_position.calculate_required_upturn(peaks[i], troughs[i], context.upturn_coefficient)*troughs[i] else -1 for i in range(len(prices))]
+
+    # if there exists at least one upturning index
+    if max(upturns) > 0 and len(broker.open_orders) == 0:
+        # determine rank of positions and their list locations
+        ranked_symbols, ranked_symbol_indices = strategy_single_position.determine_best_position(peaks, prices, upturns, context.indices)
+
+        for i, symbol in enumerate(ranked_symbols):  # iterate through symbol ranking
+
+            # check if there are no open positions
+            if sum(no_of_shares) == 0:
+                broker.order_target_percent(symbol, 1.0, prices[symbol])  # order best position with 100% of portfolio value
+                context.bought_symbol = symbol  # save the bought symbol
+                context.buy_price = prices[ranked_symbol_indices[i]]  # save buy_price
+                context.bought_list_index = ranked_symbol_indices[i]  # save list index of bought symbol
+                context.days_since_investment = 1  # initialise number of days investment has been held
+                context.investment_extremum = rolling_extremum.RollingExtremum(1)  # reset peak price of investment
+                break
+
+            # OTHERWISE, if we are not currently holding the best index and have met the minimum return requirement per position and can afford to buy
+            elif symbol != context.bought_symbol and (prices[context.bought_list_index]/context.buy_price >= context.min_return+1 or prices[context.bought_list_index] < context.stop_loss*peak_investment_price) and prices[ranked_symbol_indices[i]] < context.portfolio.portfolio_value:
+                broker.order_target_percent(context.bought_symbol, 0.0, prices[context.bought_symbol])  # neutralise current position
+                broker.order_target_percent(symbol, 1.0, prices[symbol])  # order best position with 100% of portfolio value
+                context.bought_symbol = symbol  # save the bought symbol
+                context.buy_price = prices[ranked_symbol_indices[i]]  # save buy_price
+                context.bought_list_index = ranked_symbol_indices[i]  # save list index of bought symbol
+                context.days_since_investment = 1  # initialise number of days investment has been held
+                context.investment_extremum = rolling_extremum.RollingExtremum(1)  # reset peak price of investment
+                break
+
+            elif symbol == context.bought_symbol:  # if the current position is the best position stop looking through ranking
+                context.days_since_investment += 1  # add one to number of days since has been held
+                break
+
+    elif sum(no_of_shares) > 0:  # if we have an open position
+        context.days_since_investment += 1  # add one to number of days since has been held
+
+        # if investment drops below stop loss
+        if prices[context.bought_list_index] < context.stop_loss * peak_investment_price and context.bought_symbol not in broker.open_assets():
+            broker.order_target_percent(context.bought_symbol, 0.0, prices[context.bought_symbol])  # neutralise position
+
+
+# FUNCTION TO RUN A BACKTEST OF ONE PARAMETER SET - RETURNS DATAFRAME WITH RETURNS, PORTFOLIO VALUE AND ALPHA
+# monitor (see pruning.PruningMonitor) checks the portfolio value at the end of each day and may stop the backtest
+def run_algorithm(start, end, capital_base, market, parameters, multiple=True, benchmark='^GSPC', monitor=None):
+
+    dates = market['dates']
+    first = dates.searchsorted(pd.Timestamp(start))  # first session on or after start
+    last = dates.searchsorted(pd.Timestamp(end), side='right')  # last session on or before end
+    window = slice_market(market, first, last)  # signals for the days of the backtest
+    no_of_days = last - first
+
+    portfolio = Portfolio(capital_base, len(market['tickers']))
+    context = Context(list(range(len(market['tickers']))), portfolio, parameters)
+
+    if multiple:
+        broker = Broker(portfolio, per_trade(15.0))  # commission set by strategy_multiple_positions
+
+        # dates x tickers arrays of upturning indices and indices considered for ordering
+        corrections = signals.compute_corrections(window, context.correction_margin, context.min_gain)
+        context.upturns = signals.compute_upturns(window, corrections, context.upturn_coefficient)
+        context.consider = signals.compute_consider(window, context.state_threshold)
+
+    else:
+        broker = Broker(portfolio, per_share(0.001))  # zipline default commission (strategy_single_position sets none)
+
+        context.days_of_correction = np.zeros(len(market['tickers']), dtype=int)
+        context.troughs = np.full(len(market['tickers']), -1.0)
+
+    portfolio_values = np.zeros(no_of_days)  # end of day portfolio values
+
+    for day in range(no_of_days):
+
+        broker.fill(window['prices'][day], window['traded'][day])  # fill yesterdays orders at todays close
+        broker.update_portfolio_value(window['prices'][day])
+
+        if multiple:
+            multiple_positions_day(context, broker, window, day)
+        else:
+            single_position_day(context, broker, window, day)
+
+        portfolio_values[day] = portfolio.portfolio_value
+
+        if monitor is not None:
+            monitor.check(portfolio.portfolio_value)
+
+    returns = np.diff(np.concatenate([[capital_base], portfolio_values])) / np.concatenate([[capital_base], portfolio_values[:-1]])
+
+    benchmark_returns = get_benchmark_returns(market, first, last, benchmark)
+
+    alpha = np.full(no_of_days, np.nan)  # only the alpha of the whole backtest is calculated
+    if no_of_days > 0:
+        alpha[-1] = calculate_alpha(returns, benchmark_returns)
+
+    return pd.DataFrame({'returns': returns, 'portfolio_value': portfolio_values, 'alpha': alpha}, index=window['dates'])
+
+
+# FUNCTION TO RUN BACKTESTS OF MANY STRATEGY_MULTIPLE_POSITIONS PARAMETER SETS IN ONE PASS OVER THE DAYS
+# parameter_sets has a row of (correction_margin, upturn_coefficient, min_gain, state_threshold) for each backtest.
+# Signals and portfolios are held as parameter sets x indices arrays, only the stack of a parameter set with an
+# upturning index is calculated one set at a time. Returns a dict with parameter sets x days arrays of 'returns' and
+# 'portfolio_value' and the 'alpha' of each whole backtest
+def run_batch(start, end, capital_base, market, parameter_sets, benchmark='^GSPC'):
+
+    dates = market['dates']
+    first = dates.searchsorted(pd.Timestamp(start))  # first session on or after start
+    last = dates.searchsorted(pd.Timestamp(end), side='right')  # last session on or before end
+    window = slice_market(market, first, last)  # signals for the days of the backtest
+    no_of_days = last - first
+
+    parameter_sets = np.asarray(parameter_sets, dtype=float)
+    no_of_sets = len(parameter_sets)
+    no_of_indices = len(market['tickers'])
+
+    # parameter sets x 1 columns of each parameter (broadcast against the indices of each day)
+    correction_margins = parameter_sets[:, [0]]
+    upturn_coefficients = parameter_sets[:, [1]]
+    min_gains = parameter_sets[:, [2]]
+    state_thresholds = parameter_sets[:, [3]]
+
+    commission = 15.0  # per trade commission set by strategy_multiple_positions
+    cash = np.full(no_of_sets, float(capital_base))  # cash available for each parameter set
+    positions = np.zeros((no_of_sets, no_of_indices), dtype=int)  # number of shares held
+    open_orders = np.zeros((no_of_sets, no_of_indices), dtype=int)  # number of shares ordered waiting to be filled
+    portfolio_values = np.zeros((no_of_sets, no_of_days))  # end of day portfolio values
+
+    portfolio = Portfolio(capital_base, no_of_indices)  # portfolio value read by stack_portfolio for one set at a time
+    context = Context(list(range(no_of_indices)), portfolio, {})
+
+    for day in range(no_of_days):
+
+        prices_today = window['prices'][day]
+
+        # fill yesterdays orders for indices which have traded at todays close
+        filled = (open_orders != 0) & window['traded'][day]
+        filled_orders = np.where(filled, open_orders, 0)
+        positions += filled_orders
+        cash -= np.sum(filled_orders * np.where(filled, prices_today, 0.0), axis=1) + commission * np.sum(filled, axis=1)
+        open_orders[filled] = 0
+
+        # revalue the portfolios at todays prices
+        values = cash + np.sum(np.where(positions != 0, positions * prices_today, 0.0), axis=1)
+
+        # parameter sets x indices arrays of upturning indices and indices considered for ordering
+        today = {'prices': prices_today, 'peaks': window['peaks'][day], 'troughs': window['troughs'][day],
+                 'five_prev_days_avg': window['five_prev_days_avg'][day]}
+        if 'critical_upturn_coefficients' in window:
+            today['critical_upturn_coefficients'] = window['critical_upturn_coefficients'][day]
+        corrections = signals.compute_corrections(today, correction_margins, min_gains)
+        upturns = signals.compute_upturns(today, corrections, upturn_coefficients)
+        consider = signals.compute_consider(today, state_thresholds)
+
+        # parameter sets with at least one upturning index and no open orders
+        stacking = np.flatnonzero((upturns.max(axis=1) > 0) & ~open_orders.any(axis=1))
+
+        if len(stacking) > 0:
+
+            prices = prices_today.tolist()
+            peaks = window['peaks'][day].tolist()
+
+            for i in stacking:
+                portfolio.portfolio_value = values[i]
+                stack = strategy_multiple_positions.stack_portfolio(peaks, prices, upturns[i].tolist(), context, consider[i].tolist())  # determine optimal stack
+                open_orders[i] = np.array(stack, dtype=int) - positions[i]  # determine the order amounts
+
+        portfolio_values[:, day] = values
+
+    previous_values = np.concatenate([np.full((no_of_sets, 1), float(capital_base)), portfolio_values[:, :-1]], axis=1)
+    returns = (portfolio_values - previous_values) / previous_values
+
+    benchmark_returns = get_benchmark_returns(market, first, last, benchmark)
+
+    alpha = np.full(no_of_sets, np.nan)  # alpha of the whole backtest for each parameter set
+    if no_of_days > 0:
+        for i in range(no_of_sets):
+            alpha[i] = calculate_alpha(returns[i], benchmark_returns)
+
+    return {'dates': window['dates'], 'returns': returns, 'portfolio_value': portfolio_values, 'alpha': alpha}
+
+
+# FUNCTION TO GET THE BENCHMARK RETURNS FROM THE PREVIOUS SESSION CLOSE FOR THE ROWS BETWEEN TWO ROW NUMBERS
+def get_benchmark_returns(market, first, last, benchmark):
+
+    benchmark_prices = market['prices'][max(first - 1, 0):last, market['tickers'].index(benchmark)]
+    benchmark_returns = benchmark_prices[1:] / benchmark_prices[:-1] - 1
+    if first == 0:  # no previous session at the start of the data
+        benchmark_returns = np.concatenate([[0.0], benchmark_returns])
+
+    return benchmark_returns
+
+
+# FUNCTION TO COMPARE THE FAST ENGINE WITH ZIPLINE FOR ONE PARAMETER SET ON A DATA PANEL (see tests/test_fast_engine.py)
+# raises AssertionError if the portfolio values (relative), daily returns or alpha differ by more than the tolerances
+def check_parity(start, end, capital_base, panel, tickers, parameters, multiple=True, tolerance=1e-6, alpha_tolerance=1e-4):
+
+    import functools
+    import pickle
+    import zipline
+    import optimize
+
+    # pickle tickers and signals for the optimisation initialize functions
+    with open('optimisation_tickers.pickle', 'wb') as handle:
+        pickle.dump(tickers, handle)
+    signals.save_signals(panel, tickers, 'optimisation_signals.pickle')
+
+    if multiple:
+        initialize = functools.partial(optimize.optimize_initialize_multiple, parameters=parameters)
+        handle_data = strategy_multiple_positions.handle_market_corrections
+    else:
+        initialize = functools.partial(optimize.optimize_initialize_single, parameters=parameters)
+        handle_data = strategy_single_position.handle_market_corrections
+
+    zipline_performance = zipline.run_algorithm(start=start, end=end, initialize=initialize, capital_base=capital_base,
+                                                handle_data=handle_data, data=panel)
+    fast_performance = run_algorithm(start, end, capital_base, load_market(panel, tickers), parameters, multiple)
+
+    for pickle_file in ['optimisation_tickers.pickle', 'optimisation_signals.pickle']:
+        os.remove(pickle_file)  # delete pickle files
+
+    # compare end of day portfolio values, daily returns and alpha
+    zipline_values = zipline_performance['portfolio_value'].values
+    fast_values = fast_performance['portfolio_value'].values
+    value_error = np.max(np.abs(zipline_values - fast_values) / zipline_values)
+    return_error = np.max(np.abs(zipline_performance['returns'].values - fast_performance['returns'].values))
+    alpha_error = abs(zipline_performance['alpha'][-1] - fast_performance['alpha'][-1])
+
+    print('Max relative portfolio value difference: ' + str(value_error))
+    print('Max daily return difference: ' + str(return_error))
+    print('Alpha difference: ' + str(alpha_error))
+
+    assert value_error <= tolerance, 'Portfolio values differ from zipline by up to ' + str(value_error)
+    assert return_error <= tolerance, 'Daily returns differ from zipline by up to ' + str(return_error)
+    assert alpha_error <= alpha_tolerance, 'Alpha differs from zipline by ' + str(alpha_error)
+
+    return value_error, return_error, alpha_error
+
@@ -0,0 +1,150 @@
+# CONCURRENT INCREMENTAL DOWNLOAD OF INDEX DATA
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Tickers are fetched across a pool of threads. If a ticker already has a CSV file only the days after its last stored
+# date are fetched and appended to it, so refreshing the data only downloads the new days. Failed fetches are retried
+# with an exponential backoff. Data is fetched by a provider - any object with a fetch(ticker, start, end) method
+# returning a dataframe of daily OHLCV data indexed by date - so the source can be swapped (e.g. CsvProvider reading
+# from a local folder or a local http server).
+#
+# TO UPDATE THE WORLD INDICES DATA USING COMMAND LINE INTERFACE:
+# python index_data.py
+# python index_data.py --workers 8 --retries 3
+
+import os
+import time
+import argparse
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+
+# PROVIDER OF DATA FROM YAHOO FINANCE
+class YahooProvider:
+
+    def __init__(self):
+
+        import pandas_datareader.data as web
+        import fix_yahoo_finance
+
+        fix_yahoo_finance.pdr_override()  # override DataReader function (yahoo finance fix)
+        self.web = web
+
+    # FUNCTION TO FETCH THE DATA OF A TICKER BETWEEN TWO DATES
+    def fetch(self, ticker, start, end):
+
+        return self.web.get_data_yahoo(ticker, start, end)
+
+
+# PROVIDER OF DATA FROM CSV FILES IN A FOLDER OR AT A URL ('{location}{ticker}.csv')
+class CsvProvider:
+
+    def __init__(self, location):
+
+        self.location = location
+
+    # FUNCTION TO FETCH THE DATA OF A TICKER BETWEEN TWO DATES
+    def fetch(self, ticker, start, end):
+
+        ticker_data = pd.read_csv(self.location + '{}.csv'.format(ticker), index_col=0, parse_dates=True)
+
+        return ticker_data[(ticker_data.index >= pd.Timestamp(start)) & (ticker_data.index <= pd.Timestamp(end))]
+
+
+# FUNCTION TO FETCH THE DATA OF A TICKER, RETRYING WITH AN EXPONENTIAL BACKOFF IF IT FAILS
+def fetch_with_retries(provider, ticker, start, end, retries=3, backoff=1.0):
+
+    for attempt in range(retries + 1):
+        try:
+            return provider.fetch(ticker, start, end)
+        except Exception:
+            if attempt == retries:  # no retries left
+                raise
+            time.sleep(backoff * 2 ** attempt)  # wait 1, 2, 4... x backoff seconds before retrying
+
+
+# FUNCTION TO GET THE LAST DATE STORED IN A TICKER CSV FILE (None if there is no file)
+def get_last_date(path):
+
+    if not os.path.exists(path):
+        return None
+
+    dates = pd.read_csv(path, index_col=0, parse_dates=True, usecols=[0]).index
+
+    return dates[-1] if len(dates) > 0 else None
+
+
+# FUNCTION TO FETCH AND STORE THE DAYS OF A TICKER AFTER ITS LAST STORED DATE - RETURNS NUMBER OF DAYS ADDED
+def update_ticker(ticker, start, end, csv_directory, provider, retries=3, backoff=1.0):
+
+    path = csv_directory + '{}.csv'.format(ticker)
+    last_date = get_last_date(path)
+
+    if last_date is not None:  # only fetch days after the last stored date
+        start = max(pd.Timestamp(start), last_date + dt.timedelta(days=1))
+        if start > pd.Timestamp(end):  # data is already up to date
+            return 0
+
+    ticker_data = fetch_with_retries(provider, ticker, start, end, retries, backoff)
+
+    if last_date is None:  # save all data to a new csv file
+        ticker_data.to_csv(path)
+        return len(ticker_data)
+
+    stored_columns = pd.read_csv(path, index_col=0, nrows=0).columns  # keep the column order of the csv file
+    ticker_data = ticker_data[ticker_data.index > last_date][stored_columns]
+
+    if len(ticker_data) > 0:
+        ticker_data.to_csv(path, mode='a', header=False)  # append new days to csv file
+
+    return len(ticker_data)
+
+
+# FUNCTION TO UPDATE THE CSV FILES OF TICKERS ACROSS A POOL OF THREADS - RETURNS {ticker: days added (None if failed)}
+def update_index_data(tickers, start, end, csv_directory, provider=None, max_workers=8, retries=3, backoff=1.0):
+
+    if provider is None:
+        provider = YahooProvider()
+
+    if not os.path.exists(csv_directory):
+        os.makedirs(csv_directory)  # create folder for index data
+
+    # FUNCTION TO UPDATE ONE TICKER IN A THREAD (None if it fails)
+    def update(ticker):
+
+        try:
+            return update_ticker(ticker, start, end, csv_directory, provider, retries, backoff)
+        except Exception:
+            return None
+
+    days_added = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for ticker, no_of_days in zip(tickers, executor.map(update, tickers)):  # results in ticker order
+
+            days_added[ticker] = no_of_days
+
+            if no_of_days is None:
+                print('Error fetching data for {}'.format(ticker))
+            else:
+                print(ticker + ': ' + str(no_of_days) + ' days added')  # print ticker when data is saved
+
+    return days_added
+
+
+if __name__ == '__main__':
+
+    # List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
+    indices_tickers = ['^GSPC', '^DJI', '^IXIC', '^NYA', '^XAX', '^BUK100P', '^RUT', '^FTSE', '^GDAXI', '^FCHI',
+                       '^STOXX50E', '^N100', '^BFX', 'IMOEX.ME', '^N225', '^HSI', '000001.SS', '^STI', '^AXJO', '^AORD',
+                       '^BSESN', '^JKSE', '^KLSE', '^NZ50', '^KS11', '^TWII', '^GSPTSE', '^BVSP', '^MXX', '^IPSA',
+                       '^MERV', '^TA125.TA', '^CASE30', '^JN0U.JO']
+
+    parser = argparse.ArgumentParser(description='Download new days of the world indices data')
+    parser.add_argument('--workers', type=int, default=8, help='number of tickers fetched at once')
+    parser.add_argument('--retries', type=int, default=3, help='number of retries of a failed fetch')
+    arguments = parser.parse_args()
+
+    update_index_data(indices_tickers, dt.datetime(1985, 1, 1), dt.datetime.now(), 'World_indices_data/',
+                      max_workers=arguments.workers, retries=arguments.retries)
@@ -7,44 +7,188 @@ import zipline
 import optimize
 import strategy_single_position
 import strategy_multiple_positions
-import os
 import numpy as np
 import math
 import random
-import pandas as pd
 import datetime
 import time
 import pytz
+import functools
+import multiprocessing
+import queue
+import fast_engine
+import result_cache
+import pruning
+import result_store
+import checkpoint_log
+import shared_panel
 
 
 # FUNCTION TO RUN OPTIMISATION OF PARAMETERS -- EXHAUSTIVE SEARCH
-def exhaustive_search(start, end, initial_capital, panel, random_timeframes=False, years=5, multiple=True):
+# parameter sets are backtested across a pool of processes if processes > 1, results are stored in grid order.
+# If a checkpoint_file is given each result is appended to it (see checkpoint_log) and parameter sets already in the
+# file are not backtested again, so an interrupted search can be resumed. Market data already loaded for the fast
+# engine can be passed in as market
+def exhaustive_search(start, end, initial_capital, panel, random_timeframes=False, years=5, multiple=True, fast=False, processes=1, checkpoint_file=None, market=None):
 
-    first = True  # indicate the first test of parameter sets
-    multiple = True  # MULTIPLE POSITION STRATEGY
+    if market is None:
+        market = load_market(panel) if fast else None  # prices and signals for the fast engine
+    parameter_sets = get_parameter_grid(multiple)  # all possible combinations of values
+    no_of_sets = len(parameter_sets)  # number of parameter sets
 
-    '''---------------------------- SET OF PROPOSED PARAMETER VALUES TO BE OPTIMISED ------------------------'''
-    correction_margins = [0.1]  # the percentage drawdown considered a correction
-    upturn_coefficients = np.arange(0.05, 0.5, 0.01)  # the ratio upturn from trough indicating end of correction
-    min_gains = [0.05]  # the highest the price can be from peak and still be considered for ordering
+    # timeframe of each parameter set
+    timeframes = []
+    for _ in parameter_sets:
 
-    if not multiple:  # include min return and stop loss if not using multi positions
+        if random_timeframes:  # if optimisation uses random timeframes
+            timeframes.append(get_random_timeframe(start, end, years))  # get new random timeframe
+        else:
+            timeframes.append((start, end))
 
-        min_returns = [0.02]  # the minimum return required before changing positions
-        stop_losses = np.linspace(0.82, 0.86, 5)  # lowest proportion of investment peak
+    # backtests of each parameter set (start, end, initial capital, parameters, multiple)
+    tasks = [(timeframe[0], timeframe[1], initial_capital, parameters, multiple) for timeframe, parameters in zip(timeframes, parameter_sets)]
 
-        # calculate number of parameter sets
-        no_of_sets = len(correction_margins) * len(upturn_coefficients) * len(min_returns) * len(min_gains) * len(stop_losses)
-    else:  # if using multiple positions
+    results = None  # initialise results placeholder
+    no_of_completions = 0  # set number of completed tests to zero
 
-        state_thresholds = [0.03]  # threshold between bull and bear markets
-        # calculate number of parameter sets
-        no_of_sets = len(correction_margins) * len(upturn_coefficients) * len(min_gains) * len(state_thresholds)
+    if checkpoint_file is not None:  # resume from the results of a previous run
 
-    no_of_completions = 0  # set number of completed tests to zero
+        completed = set()  # parameter sets already backtested
+        records = checkpoint_log.read_log(checkpoint_file)
+        checkpoint_log.check_pruning(records, pruning=False)  # exhaustive search does not prune backtests
+
+        for record in records:
+            results = store_result(results, record['mean_daily_return'], record['alpha'], record['parameters'])
+            completed.add(checkpoint_log.parameters_key(record['parameters']))
+            no_of_completions += 1
+
+        tasks = [task for task in tasks if checkpoint_log.parameters_key(task[3]) not in completed]  # remaining backtests
+        log = checkpoint_log.CheckpointLog(checkpoint_file)
+
+        print('Resuming from ' + str(no_of_completions) + ' completed parameter sets')
+
+    start_timer = time.time()  # initialise timer
+
+    # search through all possible combinations of values
+    for task, evaluation in zip(tasks, backtest_tasks(tasks, panel, market, processes)):
+
+        start, end, _, parameters, _ = task
+        mean_daily_return, alpha = evaluation  # mean daily return and alpha of backtest
+
+        results = store_result(results, mean_daily_return, alpha, parameters)  # store result for parameters
+
+        if checkpoint_file is not None:
+            log.write(checkpoint_log.make_record(parameters, mean_daily_return, alpha, start, end))  # checkpoint result
+
+        no_of_completions += 1  # amend completion
+        print('Parameter set ' + str(no_of_completions) + ' of ' + str(no_of_sets))  # print episode number
+        print('Timeframe: ' + str(start.date()) + ' ~ ' + str(end.date()))  # print episode/backtest timeframe
+        print('Mean daily return: ' + str(round(mean_daily_return * 100, 3)) + '%')  # print mean daily return
+        print('Alpha: ' + str(alpha))  # print alpha across whole backtest
+        print('COMPLETION: ' + str(round((no_of_completions / no_of_sets) * 100, 4)) + '%')  # print completion percentage
+        print('TIME ELAPSED: ' + str(datetime.timedelta(seconds=round((time.time() - start_timer), 0))))  # print elapsed time
+        print('---------------------------------------------------------------------------------')  # separate episode data
+
+    if checkpoint_file is not None:
+        log.close()
+
+    return results.to_dict()  # return the stored parameters and mean daily returns and alphas
+
+
+# FUNCTION TO RUN OPTIMISATION OF MULTIPLE POSITION PARAMETERS -- EXHAUSTIVE SEARCH IN ONE BATCHED PASS
+# every parameter set of the exhaustive search grid is stepped through the days together by the fast engine, so the
+# data and signals are only loaded once (all parameter sets are tested over the same timeframe)
+def batch_search(start, end, initial_capital, panel):
+
+    market = load_market(panel)  # prices and signals for the fast engine
+    parameter_sets = get_parameter_grid(multiple=True)  # all possible combinations of values
+
+    start_timer = time.time()  # initialise timer
+
+    # parameter sets x (correction_margin, upturn_coefficient, min_gain, state_threshold) array
+    parameter_array = [[parameters['correction_margin'], parameters['upturn_coefficient'], parameters['min_gain'],
+                        parameters['state_threshold']] for parameters in parameter_sets]
+    performance = fast_engine.run_batch(start, end, initial_capital, market, parameter_array)
+
+    # calculate mean daily return and alpha of each parameter set
+    mean_daily_returns = performance['returns'].mean(axis=1)
+    alphas = performance['alpha']
+
+    results = None  # initialise results placeholder
+
+    for i, parameters in enumerate(parameter_sets):
+        results = store_result(results, mean_daily_returns[i], alphas[i], parameters)  # store result for parameters
+
+    print('Parameter sets: ' + str(len(parameter_sets)))  # print number of parameter sets
+    print('Timeframe: ' + str(start.date()) + ' ~ ' + str(end.date()))  # print backtest timeframe
+    print('TIME ELAPSED: ' + str(datetime.timedelta(seconds=round((time.time() - start_timer), 0))))  # print elapsed time
+
+    return results.to_dict()  # return the stored parameters and mean daily returns and alphas
+
+
+# FUNCTION TO OPTIMISE PARAMETERS WITH SUCCESSIVE HALVING
+# random parameter sets are screened on short random timeframes (rung_years long) and only the best 1/eta of each
+# rung are backtested on the next longer timeframe, the survivors of the last rung are backtested over start ~ end.
+# Returns the results of the final rung
+def successive_halving(start, end, initial_capital, panel, multiple=True, fast=False, processes=1, num_candidates=81, eta=3, rung_years=(2, 5), objective='mean_daily_return'):
 
+    market = load_market(panel) if fast else None  # prices and signals for the fast engine
+    parameters, ranges = get_parameter_ranges(multiple)  # parameters and the ranges they are chosen from
+
+    # propose random parameter sets (always explore)
+    candidates = [multi_armed_bandit(dict(parameters), ranges, 1.0, None, 'return', multiple) for _ in range(num_candidates)]
+
+    # timeframe of each rung, every candidate in a rung is backtested over the same timeframe
+    timeframes = [get_random_timeframe(start, end, years) for years in rung_years] + [(start, end)]
+
+    simulated_days = 0  # number of days backtested across all rungs
     start_timer = time.time()  # initialise timer
 
+    for rung, timeframe in enumerate(timeframes):
+
+        tasks = [(timeframe[0], timeframe[1], initial_capital, candidate, multiple) for candidate in candidates]
+        evaluations = list(backtest_tasks(tasks, panel, market, processes))  # (mean daily return, alpha) of each candidate
+        simulated_days += len(candidates) * (timeframe[1] - timeframe[0]).days
+
+        print('Rung ' + str(rung + 1) + ' of ' + str(len(timeframes)) + ': ' + str(len(candidates)) + ' parameter sets')  # print rung number
+        print('Timeframe: ' + str(timeframe[0].date()) + ' ~ ' + str(timeframe[1].date()))  # print rung timeframe
+        print('TIME ELAPSED: ' + str(datetime.timedelta(seconds=round((time.time() - start_timer), 0))))  # print elapsed time
+        print('---------------------------------------------------------------------------------')  # separate rung data
+
+        if rung == len(timeframes) - 1:  # the last rung is the full timeframe
+            break
+
+        # promote the best 1/eta of candidates by objective to the next rung (results which are not a number come last)
+        scores = np.array([evaluation[0] if objective == 'mean_daily_return' else evaluation[1] for evaluation in evaluations], dtype=float)
+        scores[np.isnan(scores)] = -np.inf
+        no_of_promotions = max(int(math.ceil(len(candidates) / eta)), 1)
+        promoted = np.argsort(-scores, kind='mergesort')[:no_of_promotions]
+        candidates = [candidates[i] for i in promoted]
+
+    results = None  # initialise results placeholder
+
+    for candidate, evaluation in zip(candidates, evaluations):
+        results = store_result(results, evaluation[0], evaluation[1], candidate)  # store result for parameters
+
+    # compare simulated days with backtesting every candidate over the full timeframe
+    print('Days simulated: ' + str(simulated_days) + ' (' + str(round(100 * simulated_days / (num_candidates * (end - start).days), 1)) + '% of full backtests)')
+
+    return results.to_dict()  # return the stored parameters and mean daily returns and alphas
+
+
+# FUNCTION TO CREATE THE LIST OF PARAMETER DICTIONARIES TESTED BY THE EXHAUSTIVE SEARCH
+def get_parameter_grid(multiple=True):
+
+    '''---------------------------- SET OF PROPOSED PARAMETER VALUES TO BE OPTIMISED ------------------------'''
+    correction_margins = [0.1]  # the percentage drawdown considered a correction
+    upturn_coefficients = np.arange(0.05, 0.5, 0.01)  # the ratio upturn from trough indicating end of correction
+    min_gains = [0.05]  # the highest the price can be from peak and still be considered for ordering
+    min_returns = [0.02]  # the minimum return required before changing positions (single position only)
+    stop_losses = np.linspace(0.82, 0.86, 5)  # lowest proportion of investment peak (single position only)
+    state_thresholds = [0.03]  # threshold between bull and bear markets (multiple positions only)
+
+    parameter_sets = []
+
     # search through all possible combinations of values
     for correction_margin in correction_margins:
         for upturn_coefficient in upturn_coefficients:
@@ -54,142 +198,29 @@ def exhaustive_search(start, end, initial_capital, panel, random_timeframes=Fals
 
                     for state_threshold in state_thresholds:
 
-                        if random_timeframes:  # if optimisation uses random timeframes
-                            if no_of_completions == 0:  # if this is the first episode
-                                start_date = start  # rename starts and ends
-                                end_date = end
-
-                            start, end = get_random_timeframe(start_date, end_date, years)  # get new random timeframe
-
                         # create parameter dictionary
-                        parameters = {'correction_margin': correction_margin,
-                                      'upturn_coefficient': upturn_coefficient,
-                                      'min_gain': min_gain,
-                                      'state_threshold': state_threshold}
-
-                        # pickle parameter dictionary
-                        with open('parameters.pickle', 'wb') as handle:
-                            pickle.dump(parameters, handle)
-
-                        # run zipline backtest
-                        performance = zipline.run_algorithm(start=start,  # start
-                                                            end=end,  # end
-                                                            initialize=optimize.optimize_initialize_multiple,  # initialize function
-                                                            capital_base=initial_capital,  # initial capital
-                                                            handle_data=strategy_multiple_positions.handle_market_corrections,  # handle_data function
-                                                            data=panel)  # data to test against
-
-                        # calculate mean daily return and alpha
-                        mean_daily_return = sum(performance['returns']) / len(performance['returns'])
-                        alpha = performance['alpha'][-1]
-
-                        # store result for parameters
-                        if first is True:
-                            # create result dict
-                            results = {'mean_daily_return': [mean_daily_return],
-                                       'alpha': [alpha],
-                                       'correction_margin': [correction_margin],
-                                       'upturn_coefficient': [upturn_coefficient],
-                                       'min_gain': [min_gain],
-                                       'state_threshold': [state_threshold]}
-                            first = False  # indicate subsequent optimisation tests
-                        else:
-
-                            # update result dict
-                            results['mean_daily_return'].insert(0, mean_daily_return)
-                            results['alpha'].insert(0, alpha)
-                            results['correction_margin'].insert(0, correction_margin)
-                            results['upturn_coefficient'].insert(0, upturn_coefficient)
-                            results['min_gain'].insert(0, min_gain)
-                            results['state_threshold'].insert(0, state_threshold)
-
-                        no_of_completions += 1  # amend completion
-                        print('Parameter set ' + str(no_of_completions) + ' of ' + str(no_of_sets))  # print episode number
-                        print('Timeframe: ' + str(start.date()) + ' ~ ' + str(end.date()))  # print episode/backtest timeframe
-                        print('Mean daily return: ' + str(round(mean_daily_return * 100, 3)) + '%')  # print mean daily return
-                        print('Alpha: ' + str(alpha))  # print alpha across whole backtest
-                        print('COMPLETION: ' + str(round((no_of_completions / no_of_sets) * 100, 4)) + '%')  # print completion percentage
-                        print('TIME ELAPSED: ' + str(datetime.timedelta(seconds=round((time.time() - start_timer), 0))))  # print elapsed time
-                        print('---------------------------------------------------------------------------------')  # separate episode data
+                        parameter_sets.append({'correction_margin': correction_margin,
+                                               'upturn_coefficient': upturn_coefficient,
+                                               'min_gain': min_gain,
+                                               'state_threshold': state_threshold})
 
                 else:  # IF NOT USING MULTI POSITIONS
 
                     for min_return in min_returns:
                         for stop_loss in stop_losses:
 
-                            if random_timeframes:  # if optimisation uses random timeframes
-                                if no_of_completions == 0:  # if this is the first episode
-                                    start_date = start  # rename starts and ends
-                                    end_date = end
-
-                                start, end = get_random_timeframe(start_date, end_date, years)  # get new random timeframe
-
                             # create parameter dictionary
-                            parameters = {'correction_margin': correction_margin,
-                                          'upturn_coefficient': upturn_coefficient,
-                                          'min_return': min_return,
-                                          'min_gain': min_gain,
-                                          'stop_loss': stop_loss}
-
-                            # pickle parameter dictionary
-                            with open('parameters.pickle', 'wb') as handle:
-                                pickle.dump(parameters, handle)
-
-                            # run zipline backtest
-                            performance = zipline.run_algorithm(start=start,  # start
-                                                                end=end,  # end
-                                                                initialize=optimize.optimize_initialize_single,  # initialize function
-                                                                capital_base=initial_capital,  # initial capital
-                                                                handle_data=strategy_single_position.handle_market_corrections,  # handle_data function
-                                                                data=panel)  # data to test against
-
-                            # calculate mean daily return and alpha
-                            mean_daily_return = sum(performance['returns']) / len(performance['returns'])
-                            alpha = performance['alpha'][-1]
-
-                            # store result for parameters
-                            if first is True:
-                                # create result dict
-                                results = {'mean_daily_return': [mean_daily_return],
-                                           'alpha': [alpha],
-                                           'correction_margin': [correction_margin],
-                                           'upturn_coefficient': [upturn_coefficient],
-                                           'min_return': [min_return],
-                                           'min_gain': [min_gain],
-                                           'stop_loss': [stop_loss]}
-                                first = False  # indicate subsequent optimisation tests
-                            else:
-
-                                # update result dict
-                                results['mean_daily_return'].insert(0, mean_daily_return)
-                                results['alpha'].insert(0, alpha)
-                                results['correction_margin'].insert(0, correction_margin)
-                                results['upturn_coefficient'].insert(0, upturn_coefficient)
-                                results['min_return'].insert(0, min_return)
-                                results['min_gain'].insert(0, min_gain)
-                                results['stop_loss'].insert(0, stop_loss)
-
-                            no_of_completions += 1  # amend completion
-                            print('Parameter set ' + str(no_of_completions) + ' of ' + str(no_of_sets))  # print episode number
-                            print('Timeframe: ' + str(start.date()) + ' ~ ' + str(end.date()))  # print episode/backtest timeframe
-                            print('Mean daily return: ' + str(round(mean_daily_return*100, 3)) + '%')  # print mean daily return
-                            print('Alpha: ' + str(alpha))  # print alpha across whole backtest
-                            print('COMPLETION: ' + str(round((no_of_completions / no_of_sets) * 100, 4)) + '%')  # print completion percentage
-                            print('TIME ELAPSED: ' + str(datetime.timedelta(seconds=round((time.time() - start_timer), 0))))  # print elapsed time
-                            print('---------------------------------------------------------------------------------')  # separate episode data
-
-    os.remove('parameters.pickle')  # delete remaining parameters pickle file
-
-    return results  # return the stored parameters and mean daily returns and alphas
+                            parameter_sets.append({'correction_margin': correction_margin,
+                                                   'upturn_coefficient': upturn_coefficient,
+                                                   'min_return': min_return,
+                                                   'min_gain': min_gain,
+                                                   'stop_loss': stop_loss})
 
+    return parameter_sets
 
-# FUNCTION TO OPTIMISE WEIGHTS WITH MONTE CARLO CONTROL
-def monte_carlo(start, end, initial_capital, panel, random_timeframes=False, years=5, multiple=True):
 
-    first = True  # indicate the first test of parameter sets
-    exploit_method = 'return'
-    num_episodes = 500   # input number of episodes
-    no_of_completions = 0  # set number of completed tests to zero
+# FUNCTION TO CREATE THE PARAMETER DICTIONARY AND THE RANGES OF VALUES CHOSEN BY THE MULTI-ARMED BANDIT
+def get_parameter_ranges(multiple=True):
 
     '''---------------------------- SET OF PROPOSED PARAMETER VALUES TO BE OPTIMISED ------------------------'''
     if not multiple:  # if not using multiple positions
@@ -222,137 +253,412 @@ def monte_carlo(start, end, initial_capital, panel, random_timeframes=False, yea
                   'min_gain': [-0.05],
                   'state_threshold': [-10.0]}
 
-    start_timer = time.time()  # initialise timer
-    results = None  # initialise results placeholder
+    return parameters, ranges
 
-    for episode in range(num_episodes):  # go through episodes
 
-        if random_timeframes:  # if optimisation uses random timeframes
-            if no_of_completions == 0:  # if this is the first episode
-                start_date = start  # rename starts and ends
-                end_date = end
+# FUNCTION TO ADD THE RESULT OF A PARAMETER SET TO THE RESULT STORE (see result_store.ResultStore)
+# pruned indicates whether the backtest was stopped early (only stored if the optimiser prunes backtests)
+def store_result(results, mean_daily_return, alpha, parameters, pruned=None):
 
-            start, end = get_random_timeframe(start_date, end_date, years)  # get new random timeframe
+    result = {'mean_daily_return': mean_daily_return, 'alpha': alpha}
+    result.update(parameters)
+    if pruned is not None:
+        result['pruned'] = pruned
 
-        exploration_prob = 1 - math.exp(20 * ((episode/num_episodes) - 1))  # determine the probability of exploration for this episode
+    if results is None:  # create result store with a column for each value
+        results = result_store.ResultStore(['mean_daily_return', 'alpha'] + list(parameters.keys()) + (['pruned'] if pruned is not None else []))
 
-        parameters = multi_armed_bandit(parameters, ranges, exploration_prob, results, exploit_method, multiple)  # choose explore or exploit
+    results.append(result)
 
-        # pickle parameter dictionary
-        with open('parameters.pickle', 'wb') as handle:
-            pickle.dump(parameters, handle)
+    return results
 
-        if multiple:  # if using multiple positions
 
-            # run zipline backtest
-            performance = zipline.run_algorithm(start=start,  # start
-                                                end=end,  # end
-                                                initialize=optimize.optimize_initialize_multiple,  # initialize function
-                                                capital_base=initial_capital,  # initial capital
-                                                handle_data=strategy_multiple_positions.handle_market_corrections,  # handle_data function
-                                                data=panel)  # data to test against
-
-            # calculate mean daily return and alpha
-            mean_daily_return = sum(performance['returns']) / len(performance['returns'])
-            alpha = performance['alpha'][-1]
-
-            # store result for parameters
-            if first is True:
-                # create result dict
-                results = {'mean_daily_return': [mean_daily_return],
-                           'alpha': [alpha],
-                           'correction_margin': [parameters['correction_margin']],
-                           'upturn_coefficient': [parameters['upturn_coefficient']],
-                           'min_gain': [parameters['min_gain']],
-                           'state_threshold': [parameters['state_threshold']]}
-                first = False  # indicate subsequent optimisation tests
-            else:
+# FUNCTION TO OPTIMISE WEIGHTS WITH MONTE CARLO CONTROL
+# episodes are backtested across a pool of processes if processes > 1, a new parameter set is proposed for each
+# process as soon as it becomes idle using the results of the episodes completed so far. If pruning_rules are given
+# (see pruning.PruningRules) hopeless backtests are stopped early and recorded in the 'pruned' column of the results.
+# If a checkpoint_file is given each episode is appended to it (see checkpoint_log) and the episodes already in the
+# file are told to the bandit before starting, so an interrupted optimisation can be resumed
+def monte_carlo(start, end, initial_capital, panel, random_timeframes=False, years=5, multiple=True, fast=False, processes=1, pruning_rules=None, checkpoint_file=None):
+
+    market = load_market(panel) if fast else None  # prices and signals for the fast engine
+    exploit_method = 'return'
+    num_episodes = 500   # input number of episodes
 
-                # update result dict
-                results['mean_daily_return'].insert(0, mean_daily_return)
-                results['alpha'].insert(0, alpha)
-                results['correction_margin'].insert(0, parameters['correction_margin'])
-                results['upturn_coefficient'].insert(0, parameters['upturn_coefficient'])
-                results['min_gain'].insert(0, parameters['min_gain'])
-                results['state_threshold'].insert(0, parameters['state_threshold'])
+    parameters, ranges = get_parameter_ranges(multiple)  # parameters and the ranges they are chosen from
 
-        else:  # if not using multiple positions
+    bandit = BanditOptimiser(parameters, ranges, num_episodes, exploit_method, multiple)  # proposes parameter sets
+
+    if checkpoint_file is not None:  # resume from the episodes of a previous run
+
+        records = checkpoint_log.read_log(checkpoint_file)
+        checkpoint_log.check_pruning(records, pruning=pruning_rules is not None)  # results must have the same columns
+
+        for record in records:
 
-            # run zipline backtest
-            performance = zipline.run_algorithm(start=start,  # start
-                                                end=end,  # end
-                                                initialize=optimize.optimize_initialize_single,  # initialize function
-                                                capital_base=initial_capital,  # initial capital
-                                                handle_data=strategy_single_position.handle_market_corrections,  # handle_data function
-                                                data=panel)  # data to test against
-
-            # calculate mean daily return and alpha
-            mean_daily_return = sum(performance['returns']) / len(performance['returns'])
-            alpha = performance['alpha'][-1]
-
-            # store result for parameters
-            if first is True:
-                # create result dict
-                results = {'mean_daily_return': [mean_daily_return],
-                           'alpha': [alpha],
-                           'correction_margin': [parameters['correction_margin']],
-                           'upturn_coefficient': [parameters['upturn_coefficient']],
-                           'min_return': [parameters['min_return']],
-                           'min_gain': [parameters['min_gain']],
-                           'stop_loss': [parameters['stop_loss']]}
-                first = False  # indicate subsequent optimisation tests
+            pruned = record['pruned'] if pruning_rules is not None else None
+            if pruned is False:
+                pruning_rules.update(record['checkpoint_returns'])  # update best returns at each checkpoint
+
+            bandit.parameters = dict(record['parameters'])
+            bandit.tell(record['parameters'], record['mean_daily_return'], record['alpha'], pruned)  # restore result
+
+        log = checkpoint_log.CheckpointLog(checkpoint_file)
+
+        print('Resuming from ' + str(bandit.no_of_completions) + ' completed episodes')
+
+    if processes > 1:  # spread backtests across processes, each process is sent the data once
+        pool, layout = create_pool(processes, panel, market)
+    else:
+        pool = None
+
+    finished = queue.Queue()  # (task, evaluation) of each backtest as it finishes
+    no_of_proposals = bandit.no_of_completions  # number of parameter sets proposed
+    running = 0  # number of backtests running
+
+    start_timer = time.time()  # initialise timer
+
+    while bandit.no_of_completions < num_episodes:  # go through episodes
+
+        # propose a parameter set for each idle process (choose explore or exploit)
+        for parameters in bandit.ask(min(processes - running, num_episodes - no_of_proposals)):
+
+            if random_timeframes:  # if optimisation uses random timeframes
+                timeframe = get_random_timeframe(start, end, years)  # get new random timeframe
             else:
+                timeframe = (start, end)
 
-                # update result dict
-                results['mean_daily_return'].insert(0, mean_daily_return)
-                results['alpha'].insert(0, alpha)
-                results['correction_margin'].insert(0, parameters['correction_margin'])
-                results['upturn_coefficient'].insert(0, parameters['upturn_coefficient'])
-                results['min_return'].insert(0, parameters['min_return'])
-                results['min_gain'].insert(0, parameters['min_gain'])
-                results['stop_loss'].insert(0, parameters['stop_loss'])
+            task = (timeframe[0], timeframe[1], initial_capital, parameters, multiple)
+            if pruning_rules is not None:  # include the current best returns at each checkpoint
+                task += (pruning_rules,)
+
+            if pool is not None:  # run backtest in a worker process
+                pool.apply_async(backtest_task, (task,), callback=lambda evaluation, task=task: finished.put((task, evaluation)),
+                                 error_callback=lambda error: finished.put((None, error)))
+            else:  # run backtest and calculate mean daily return and alpha
+                finished.put((task, run_task(task, panel, market)))
+
+            no_of_proposals += 1
+            running += 1
+
+        task, evaluation = finished.get()  # wait for the next backtest to finish
+        running -= 1
+
+        if task is None:  # backtest raised an exception in a worker process
+            close_pool(pool, layout, terminate=True)
+            raise evaluation
+
+        episode_start, episode_end, parameters = task[0], task[1], task[3]
+
+        if pruning_rules is not None:
+            mean_daily_return, alpha, pruned, checkpoint_returns = evaluation  # mean daily return and alpha of backtest
+            if not pruned:
+                pruning_rules.update(checkpoint_returns)  # update best returns at each checkpoint
+        else:
+            mean_daily_return, alpha = evaluation  # mean daily return and alpha of backtest
+            pruned = None
+
+        bandit.tell(parameters, mean_daily_return, alpha, pruned)  # store result for parameters
+        no_of_completions = bandit.no_of_completions
+
+        if checkpoint_file is not None:  # checkpoint result
+            if pruning_rules is not None:
+                log.write(checkpoint_log.make_record(parameters, mean_daily_return, alpha, episode_start, episode_end,
+                                                     pruned=pruned, checkpoint_returns=[float(value) for value in checkpoint_returns]))
+            else:
+                log.write(checkpoint_log.make_record(parameters, mean_daily_return, alpha, episode_start, episode_end))
 
-        no_of_completions += 1  # amend completion
         print('Episode ' + str(no_of_completions) + ' of ' + str(num_episodes))  # print episode number
-        print('Timeframe: ' + str(start.date()) + ' ~ ' + str(end.date()))  # print episode/backtest timeframe
+        print('Timeframe: ' + str(episode_start.date()) + ' ~ ' + str(episode_end.date()))  # print episode/backtest timeframe
         print('Mean daily return: ' + str(round(mean_daily_return * 100, 3)) + '%')  # print mean daily return
         print('Alpha: ' + str(alpha))  # print alpha across whole backtest
+        if pruned:
+            print('PRUNED')  # backtest was stopped early
         print('COMPLETION: ' + str(round((no_of_completions / num_episodes) * 100, 4)) + '%')  # print completion percentage
         print('TIME ELAPSED: ' + str(datetime.timedelta(seconds=round((time.time() - start_timer), 0))))  # print elapsed time
         print('---------------------------------------------------------------------------------')  # separate episode data
 
-    os.remove('parameters.pickle')  # delete remaining parameters pickle file
+    if pool is not None:
+        close_pool(pool, layout)
+
+    if checkpoint_file is not None:
+        log.close()
+
+    return bandit.results.to_dict()  # return the stored parameters and mean daily returns and alphas
+
+
+# MULTI-ARMED BANDIT OPTIMISER WITH AN ASK/TELL INTERFACE
+# ask(k) proposes k parameter sets with the exploration probability of the evaluations completed so far and tell()
+# stores the result of a proposed parameter set once its backtest has finished (in any order)
+class BanditOptimiser:
+
+    def __init__(self, parameters, ranges, num_episodes, exploit_method, multiple):
+
+        self.parameters = parameters  # parameter dictionary (replaced by each proposal)
+        self.ranges = ranges  # range of values for each parameter
+        self.num_episodes = num_episodes  # number of evaluations the exploration probability decays over
+        self.exploit_method = exploit_method  # exploit according to 'return' or 'alpha'
+        self.multiple = multiple
+        self.results = None  # results of completed evaluations
+        self.no_of_completions = 0  # number of completed evaluations
+
+    # FUNCTION TO DETERMINE THE PROBABILITY OF EXPLORATION FROM THE NUMBER OF COMPLETED EVALUATIONS
+    def exploration_prob(self):
+
+        return 1 - math.exp(20 * ((self.no_of_completions/self.num_episodes) - 1))
+
+    # FUNCTION TO PROPOSE k PARAMETER SETS
+    def ask(self, k=1):
+
+        exploration_prob = self.exploration_prob()
+        proposals = []
+
+        for _ in range(k):
+            self.parameters = multi_armed_bandit(dict(self.parameters), self.ranges, exploration_prob, self.results, self.exploit_method, self.multiple)  # choose explore or exploit
+            proposals.append(self.parameters)
+
+        return proposals
+
+    # FUNCTION TO STORE THE RESULT OF A PROPOSED PARAMETER SET
+    def tell(self, parameters, mean_daily_return, alpha, pruned=None):
+
+        self.results = store_result(self.results, mean_daily_return, alpha, parameters, pruned)
+        self.no_of_completions += 1
+
+
+# FUNCTION TO LOAD PRICES AND SIGNALS FOR THE FAST ENGINE FROM THE DATA PANEL
+def load_market(panel):
+
+    # List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
+    with open('optimisation_tickers.pickle', 'rb') as handle:
+        indices_tickers = pickle.load(handle)  # load in tickers from pickle
+
+    return fast_engine.load_market(panel, indices_tickers)
+
+
+# DATA PANEL AND FAST ENGINE MARKET DATA OF A WORKER PROCESS (set once per process by initialize_worker)
+worker_data = {}
+
+# name of a zipline data bundle to run zipline backtests against instead of the data panel, e.g.
+# world_indices_bundle.bundle_name (the bundle must be ingested first, see world_indices_bundle)
+bundle = None
+
+
+# FUNCTION TO STORE THE DATA IN A WORKER PROCESS WHEN IT STARTS
+def initialize_worker(panel, market, data_bundle=None):
+
+    global bundle
+
+    worker_data['panel'] = panel
+    worker_data['market'] = market
+    bundle = data_bundle
+
+
+# FUNCTION TO MEMORY MAP THE SHARED DATA IN A WORKER PROCESS WHEN IT STARTS (see shared_panel)
+def initialize_shared_worker(layout, data_bundle=None):
+
+    global bundle
+
+    worker_data['panel'], worker_data['market'] = shared_panel.attach(layout)
+    bundle = data_bundle
+
+
+# FUNCTION TO START A POOL OF PROCESSES WITH THE DATA PANEL AND MARKET DATA (returns pool, shared data layout)
+# the data is written once to memory mapped files shared by all processes if shared_panel is enabled, otherwise
+# each process is sent a copy
+def create_pool(processes, panel, market):
+
+    if shared_panel.enabled:
+        layout = shared_panel.publish(panel, market)
+        pool = multiprocessing.Pool(processes, initializer=initialize_shared_worker, initargs=(layout, bundle))
+    else:
+        layout = None
+        pool = multiprocessing.Pool(processes, initializer=initialize_worker, initargs=(panel, market, bundle))
+
+    return pool, layout
+
+
+# FUNCTION TO STOP A POOL OF PROCESSES AND DELETE ITS SHARED DATA
+def close_pool(pool, layout, terminate=False):
+
+    if terminate:  # stop running tasks
+        pool.terminate()
+    else:  # wait for running tasks to finish
+        pool.close()
+    pool.join()
+
+    if layout is not None:
+        shared_panel.release(layout)
+
+
+# FUNCTION TO BACKTEST A TASK IN A WORKER PROCESS
+def backtest_task(task):
 
-    return results  # return the stored parameters and mean daily returns and alphas
+    return run_task(task, worker_data['panel'], worker_data['market'])
+
+
+# FUNCTION TO BACKTEST A (start, end, initial capital, parameters, multiple) TASK
+# tasks with pruning rules appended return (mean daily return, alpha, pruned, checkpoint returns)
+def run_task(task, panel, market):
+
+    if len(task) == 6:  # if the backtest can be stopped early
+        start, end, initial_capital, parameters, multiple, rules = task
+        return backtest_parameters_with_pruning(start, end, initial_capital, panel, parameters, multiple, market, rules)
+
+    start, end, initial_capital, parameters, multiple = task
+
+    return backtest_parameters(start, end, initial_capital, panel, parameters, multiple, market)
+
+
+# FUNCTION TO BACKTEST (start, end, initial capital, parameters, multiple) TASKS RETURNING RESULTS IN TASK ORDER
+# tasks are spread across a pool of processes if processes > 1, each process is sent the data once
+def backtest_tasks(tasks, panel, market, processes=1):
+
+    if processes > 1:
+
+        pool, layout = create_pool(processes, panel, market)
+
+        try:
+            for evaluation in pool.imap(backtest_task, tasks):
+                yield evaluation
+        finally:
+            close_pool(pool, layout)
+
+    else:
+
+        for task in tasks:
+            yield run_task(task, panel, market)
+
+
+# FUNCTION TO BACKTEST ONE PARAMETER SET AND RETURN ITS MEAN DAILY RETURN AND ALPHA
+# uses the fast engine if market data is passed (see fast_engine.load_market), otherwise zipline
+def backtest_parameters(start, end, initial_capital, panel, parameters, multiple, market=None):
+
+    if result_cache.enabled:  # check if the parameter set has already been backtested
+        cache_key = get_cache_key(start, end, initial_capital, parameters, multiple, market)
+        result = result_cache.load(cache_key)
+
+        if result is not None:
+            return result
+
+    performance = run_backtest(start, end, initial_capital, panel, parameters, multiple, market)
+
+    # calculate mean daily return and alpha
+    mean_daily_return = sum(performance['returns']) / len(performance['returns'])
+    alpha = performance['alpha'][-1]
+
+    if result_cache.enabled:
+        result_cache.save(cache_key, (mean_daily_return, alpha))  # cache result for reruns
+
+    return mean_daily_return, alpha
+
+
+# FUNCTION TO BACKTEST ONE PARAMETER SET WHICH IS STOPPED EARLY IF IT BREAKS THE PRUNING RULES
+# returns the mean daily return and alpha, whether the backtest was pruned and its total return at each checkpoint
+# (the mean daily return of a pruned backtest is of the days before it was stopped and its alpha is not a number)
+def backtest_parameters_with_pruning(start, end, initial_capital, panel, parameters, multiple, market, rules):
+
+    if result_cache.enabled:  # check if the parameter set has already been backtested to the end
+        cache_key = get_cache_key(start, end, initial_capital, parameters, multiple, market)
+        result = result_cache.load(cache_key)
+
+        if result is not None:
+            return result[0], result[1], False, []
+
+    monitor = pruning.PruningMonitor(rules, initial_capital)  # checks the portfolio value at the end of each day
+
+    try:
+        performance = run_backtest(start, end, initial_capital, panel, parameters, multiple, market, monitor)
+    except pruning.BacktestPruned:
+        return monitor.mean_daily_return(), np.nan, True, monitor.checkpoint_returns
+
+    # calculate mean daily return and alpha
+    mean_daily_return = sum(performance['returns']) / len(performance['returns'])
+    alpha = performance['alpha'][-1]
+
+    if result_cache.enabled:
+        result_cache.save(cache_key, (mean_daily_return, alpha))  # cache result for reruns
+
+    return mean_daily_return, alpha, False, monitor.checkpoint_returns
+
+
+# FUNCTION TO RUN A BACKTEST OF ONE PARAMETER SET AND RETURN THE PERFORMANCE DATAFRAME
+# uses the fast engine if market data is passed (see fast_engine.load_market), otherwise zipline with the data panel
+# (or the zipline data bundle if bundle is set)
+def run_backtest(start, end, initial_capital, panel, parameters, multiple, market=None, monitor=None):
+
+    if market is not None:  # if using the fast engine
+
+        performance = fast_engine.run_algorithm(start, end, initial_capital, market, parameters, multiple, monitor=monitor)
+
+    else:  # if using zipline
+
+        # initialize functions with the parameters passed in memory
+        if multiple:  # if using multiple positions
+            initialize = functools.partial(optimize.optimize_initialize_multiple, parameters=parameters)
+            handle_data = strategy_multiple_positions.handle_market_corrections
+        else:  # if not using multiple positions
+            initialize = functools.partial(optimize.optimize_initialize_single, parameters=parameters)
+            handle_data = strategy_single_position.handle_market_corrections
+
+        if monitor is not None:  # check the portfolio value after each day
+            handle_data = monitor.wrap(handle_data)
+
+        # data to test against
+        data_source = {'bundle': bundle} if bundle is not None else {'data': panel}
+
+        # run zipline backtest
+        performance = zipline.run_algorithm(start=start,  # start
+                                            end=end,  # end
+                                            initialize=initialize,  # initialize function
+                                            capital_base=initial_capital,  # initial capital
+                                            handle_data=handle_data,  # handle_data function
+                                            **data_source)
+
+    return performance
+
+
+# FUNCTION TO CREATE THE RESULT CACHE KEY OF A BACKTEST OF ONE PARAMETER SET
+def get_cache_key(start, end, initial_capital, parameters, multiple, market):
+
+    # List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
+    with open('optimisation_tickers.pickle', 'rb') as handle:
+        indices_tickers = pickle.load(handle)  # load in tickers from pickle
+
+    # modules which run the backtest
+    strategy_module = strategy_multiple_positions if multiple else strategy_single_position
+    engine_module = fast_engine if market is not None else optimize
+
+    # every module the backtest runs and the data pipeline (cached results are not reused once any of them change)
+    strategy = result_cache.strategy_fingerprint([strategy_module, engine_module] + result_cache.strategy_modules())
+    strategy += ';' + result_cache.pipeline_fingerprint()
+    if market is None and bundle is not None:  # bundle prices are rounded so results differ from the data panel
+        strategy += ';bundle:' + bundle
+
+    return result_cache.make_key(strategy, parameters, start, end, initial_capital, indices_tickers)
 
 
 # FUNCTION TO DETERMINE WHETHER TO EXPLORE OR EXPLOIT (MULTI-ARMED BANDIT)
 def multi_armed_bandit(parameters, ranges, exploration_prob, results, exploit_method, multiple):
 
-    if results is not None:  # if there are already results (i.e. not first episode)
-        result_df = pd.DataFrame(data=results)  # create dataframe of current results
-    else:  # if there are no results yet (i.e. first episode)
-        result_df = None  # set results data frame to none
+    # best result so far according to return or alpha (None if there are no results yet)
+    objective = 'mean_daily_return' if exploit_method == 'return' else 'alpha'
+    best_row = results.best(objective) if results is not None else None
 
     for key in parameters.keys():  # iterate through parameters
 
-        if key is 'correction_margin':
+        if key == 'correction_margin':
             parameters[key] = 0.05
 
-        elif key is 'min_gain':
+        elif key == 'min_gain':
             parameters[key] = -0.05
 
-        elif key is 'state_threshold':
+        elif key == 'state_threshold':
             parameters[key] = -10.0
 
-        elif random.random() > exploration_prob:  # exploit
-            if exploit_method is 'return':  # use mean daily return
-                result_df.sort_values('mean_daily_return', ascending=False)  # sort results according to return
-
-            elif exploit_method is 'alpha':  # use mean daily alpha
-                result_df.sort_values('alpha', ascending=False)  # sort results according to alpha
+        elif random.random() > exploration_prob and best_row is not None:  # exploit
 
-            best_value = result_df[key][0]  # select best parameter according to alpha or return
+            best_value = results.get(key, best_row)  # select best parameter according to alpha or return
 
             displacement = (max(ranges[key]) - min(ranges[key])) * 0.025
 
@@ -370,7 +676,7 @@ def multi_armed_bandit(parameters, ranges, exploration_prob, results, exploit_me
             return parameters  # return parameters values
 
     else:  # if the minimum gain is higher than the correction margin
-        parameters = multi_armed_bandit(parameters, exploration_prob, results, exploit_method, multiple)  # determine new parameter values
+        parameters = multi_armed_bandit(parameters, ranges, exploration_prob, results, exploit_method, multiple)  # determine new parameter values
         return parameters  # return new parameter values
 
 
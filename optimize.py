@@ -6,15 +6,20 @@ import pickle
 import backtest
 from datetime import datetime
 import pytz
-from zipline.api import symbol
+from zipline.api import symbol, set_benchmark, set_commission, set_slippage
+from zipline.finance import commission, slippage
 import os
 import pandas as pd
 import shutil
 import optimisers
+import world_indices_bundle
+import signals
+import strategy_multiple_positions
 
 
-# ADAPTED INITIALIZE FUNCTION TO SEQUENTIALLY READ IN NEW PARAMETERS FOR SINGLE POSITIONS
-def optimize_initialize_single(context):
+# ADAPTED INITIALIZE FUNCTION TO TAKE IN NEW PARAMETERS FOR SINGLE POSITIONS
+# parameters are passed in memory, e.g. initialize=functools.partial(optimize_initialize_single, parameters=parameters)
+def optimize_initialize_single(context, parameters):
 
     # List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
     with open('optimisation_tickers.pickle', 'rb') as handle:
@@ -22,10 +27,11 @@ def optimize_initialize_single(context):
 
     context.indices = [symbol(ticker) for ticker in indices_tickers]  # create list of ticker symbols
     context.days_of_correction = [0 for _ in indices_tickers]  # create list of days since correction has begun
-
-    # read in parameter dictionary
-    with open('parameters.pickle', 'rb') as handle:
-        parameters = pickle.load(handle)
+    context.extrema = None  # rolling peak state for each index, created on the first day (see rolling_extremum)
+    context.price_buffer = None  # last bar_days prices of each index, created on the first day (see price_buffer)
+    set_benchmark(symbol('^GSPC'))  # same benchmark as strategy_single_position and the fast engine
+    set_commission(commission.PerShare(cost=0.001))  # zipline default commission, as charged by the fast engine
+    set_slippage(slippage.FixedSlippage(spread=0.0))  # fill whole orders at the close with no volume limit like the fast engine
 
     '''---------------------------------------------- PARAMETERS --------------------------------------------------'''
     context.correction_margin = parameters['correction_margin']  # the percentage drawdown considered a correction
@@ -35,18 +41,22 @@ def optimize_initialize_single(context):
     context.stop_loss = parameters['stop_loss']  # lowest proportion of investment peak
 
 
-def optimize_initialize_multiple(context):
+# ADAPTED INITIALIZE FUNCTION TO TAKE IN NEW PARAMETERS FOR MULTIPLE POSITIONS
+# parameters are passed in memory, e.g. initialize=functools.partial(optimize_initialize_multiple, parameters=parameters)
+def optimize_initialize_multiple(context, parameters):
 
     # List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
     with open('optimisation_tickers.pickle', 'rb') as handle:
         indices_tickers = pickle.load(handle)  # load in tickers from pickle
 
-    # read in parameter dictionary
-    with open('parameters.pickle', 'rb') as handle:
-        parameters = pickle.load(handle)
-
     context.indices = [symbol(ticker) for ticker in indices_tickers]  # create list of ticker symbols
     context.days_of_correction = [0 for _ in indices_tickers]  # create list of days since correction has begun
+    context.troughs = [-1 for _ in indices_tickers]  # create list of troughs since correction has begun
+    context.extrema = None  # rolling peak state for each index, created on the first day (see rolling_extremum)
+    context.price_buffer = None  # last bar_days prices of each index, created on the first day (see price_buffer)
+    set_benchmark(symbol('^GSPC'))  # same benchmark as strategy_multiple_positions and the fast engine
+    set_commission(commission.PerTrade(cost=15.0))  # same commission as strategy_multiple_positions and the fast engine
+    set_slippage(slippage.FixedSlippage(spread=0.0))  # fill whole orders at the close with no volume limit like the fast engine
 
     '''-----------------------------PARAMETERS TO BE OPTIMISED--------------------------------'''
     context.correction_margin = parameters['correction_margin']  # the percentage drawdown considered a correction
@@ -54,6 +64,8 @@ def optimize_initialize_multiple(context):
     context.min_gain = parameters['min_gain']  # the highest the price can be from peak and still be considered for ordering
     context.state_threshold = parameters['state_threshold']
 
+    strategy_multiple_positions.initialize_signals(context, 'optimisation_signals.pickle')  # load precomputed signals for parameters
+
 
 # FUNCTION TO FORMAT AND SAVE OPTIMISATION RESULTS TO CSV
 def format_results(results, optimize_directory, multiple=True):
@@ -72,6 +84,10 @@ def format_results(results, optimize_directory, multiple=True):
 
     result_df.to_pickle(optimize_directory + 'optimisation_results.pickle')  # pickle results
 
+    if 'pruned' in result_df.columns:  # if the optimiser stopped hopeless backtests early
+        result_df_returns = result_df_returns.assign(pruned=result_df['pruned'])
+        result_df_alpha = result_df_alpha.assign(pruned=result_df['pruned'])
+
     # rank results by returns and alpha and save to csv files
     result_df_returns.sort_values('mean_daily_return', ascending=False).to_csv(optimize_directory + 'ranked_by_return.csv')
     result_df_alpha.sort_values('alpha', ascending=False).to_csv(optimize_directory + 'ranked_by_alpha.csv')
@@ -92,6 +108,9 @@ if __name__ == '__main__':
     panel = backtest.format_data(indices_tickers)  # format data for zipline backtests
     print('Data formatted for Zipline')
 
+    signals.save_signals(panel, indices_tickers, 'optimisation_signals.pickle')  # calculate signals once for all parameter sets
+    print('Signals calculated')
+
     '''-------------------------- TIMEFRAME & CAPITAL ---------------------------'''
     start = datetime(2000, 1, 1, 0, 0, 0, 0, pytz.utc)  # start of backtests
     end = datetime(2019, 12, 31, 0, 0, 0, 0, pytz.utc)  # end of backtests
@@ -99,18 +118,27 @@ if __name__ == '__main__':
 
     # directory for storing optimisation results
     optimize_directory = 'Optimize_' + str(start.date()) + '_~_' + str(end.date()) + '_$' + str(initial_capital) + '/'
+    checkpoint_file = optimize_directory + 'checkpoint.log'  # results are appended as the optimisation runs
+    resume = False  # continue an interrupted optimisation from its checkpoint log
 
     if not os.path.exists(optimize_directory):  # determine if optimisation has already been completed for given time
         os.mkdir(optimize_directory)  # creates optimisation folder
+    elif resume:
+        print('Resuming optimisation from checkpoint log: ' + checkpoint_file)
     else:
         print('Optimisation already exists over given timeframe and capital base: ' + str(start.date()) + ' ~ ' + str(end.date()) + '  $' + str(initial_capital))
         input('Press <ENTER> to continue and overwrite current optimisation for this timeframe and capital base...')
         shutil.rmtree(optimize_directory)  # delete optimisation
         os.mkdir(optimize_directory)  # creates optimisation folder
 
+    use_bundle = False  # run zipline backtests against the ingested world indices bundle instead of the data panel
+    if use_bundle:
+        optimisers.bundle = world_indices_bundle.bundle_name
+
     # RUN OPTIMISATION FUNCTION
-    results = optimisers.monte_carlo(start, end, initial_capital, panel, random_timeframes=False, years=None, multiple=True)  # CHANGE OPTIMISATION TECHNIQUE HERE
+    results = optimisers.monte_carlo(start, end, initial_capital, panel, random_timeframes=False, years=None, multiple=True, fast=False, checkpoint_file=checkpoint_file)  # CHANGE OPTIMISATION TECHNIQUE HERE
 
     format_results(results, optimize_directory, multiple=True)  # format and save optimisation results
 
     os.remove('optimisation_tickers.pickle')  # delete tickers pickle file
+    os.remove('optimisation_signals.pickle')  # delete signals pickle file
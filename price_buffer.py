@@ -0,0 +1,65 @@
+# ROLLING PRICE BUFFER FOR MARKET CORRECTION STRATEGIES
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Holds the last bar_days prices of every index in a preallocated bar_days x indices array (ring buffer) kept on
+# context. It is filled with one batched data.history call on the first day of a backtest and then only needs one
+# data.current call per day, instead of a data.history call per index per day
+
+import numpy as np
+
+
+# RING BUFFER OF THE LAST bar_days PRICES FOR EACH INDEX
+class PriceBuffer:
+
+    def __init__(self, bar_days, no_of_indices):
+
+        self.bar_days = bar_days  # number of previous prices
+        self.prices = np.full((bar_days, no_of_indices), np.nan)  # days x indices array of prices
+        self.head = 0  # row of the oldest price (the next row to be overwritten)
+
+    # FUNCTION TO FILL THE BUFFER FROM A DAYS x INDICES ARRAY OF PRICES (oldest first)
+    def fill(self, prices):
+
+        self.prices[:] = prices[-self.bar_days:]
+        self.head = 0
+
+    # FUNCTION TO ADD TODAYS PRICES FOR ALL INDICES
+    def append(self, prices):
+
+        self.prices[self.head] = prices  # overwrite oldest prices
+        self.head = (self.head + 1) % self.bar_days
+
+    # FUNCTION TO GET THE LAST days PRICES FOR ALL INDICES IN DATE ORDER (days x indices)
+    # only the rows asked for are read - a read only view of the buffer if they do not wrap around its end, otherwise
+    # the two contiguous runs of rows joined together
+    def window(self, days=None):
+
+        if days is None:
+            days = self.bar_days
+
+        start = (self.head - days) % self.bar_days  # row of the oldest price asked for
+
+        if start + days <= self.bar_days:  # rows do not wrap around the end of the buffer
+            rows = self.prices[start:start + days]
+            rows.flags.writeable = False  # view of the buffer so must not be changed by callers
+            return rows
+
+        return np.concatenate((self.prices[start:], self.prices[:self.head]))  # oldest rows up to the end then the newest
+
+    # FUNCTION TO GET TODAYS PRICES FOR ALL INDICES
+    def latest(self):
+
+        return self.prices[(self.head - 1) % self.bar_days]
+
+
+# FUNCTION TO UPDATE THE PRICE BUFFER ON CONTEXT WITH TODAYS PRICES
+def update_price_buffer(context, data, bar_days):
+
+    if context.price_buffer is None:  # if this is the first day of the backtest fill the buffer from history
+        context.price_buffer = PriceBuffer(bar_days, len(context.indices))
+        context.price_buffer.fill(data.history(context.indices, 'price', bar_days, '1d').values)
+    else:  # otherwise only todays prices are needed
+        context.price_buffer.append(data.current(context.indices, 'price').values)
+
+    return context.price_buffer
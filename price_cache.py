@@ -0,0 +1,142 @@
+# BINARY CACHE OF INDEX PRICES
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# The ticker CSV files are parsed and cleaned (see data_cleaning) ONCE into a single dense tickers x dates x OHLCV
+# prices.npy file aligned on the union of the trading calendars of all tickers, with the dates saved in dates.npy.
+# A manifest records the tickers, the size and modified time of each CSV file and the cleaning (a hash of the
+# data_cleaning source code and the cleaning arguments), and the cache is rebuilt when any of them change. Later runs memory map prices.npy, so the data panel is built on the file without parsing the CSV files
+# again or copying the prices.
+#
+# TO BUILD OR CLEAR THE CACHE USING COMMAND LINE INTERFACE:
+# python price_cache.py build
+# python price_cache.py clear
+
+import os
+import json
+import hashlib
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import data_cleaning
+
+
+enabled = True  # load prices from the cache instead of the csv files
+cache_directory = 'Price_cache/'  # folder of cached prices
+columns = ['Open', 'High', 'Low', 'Close', 'Volume']  # csv columns cached
+fields = ['open', 'high', 'low', 'close', 'volume']  # names of the cached fields (last axis of prices.npy)
+version = 3  # format of the cache files (caches of other versions are rebuilt)
+cleaning = {'nan_prices': 'drop', 'max_spike': 0.25, 'default_volume': 10000000}  # arguments of data_cleaning.clean_data
+
+
+# FUNCTION TO GET THE SIZE AND MODIFIED TIME OF THE CSV FILE OF EACH TICKER
+def get_file_stats(tickers, csv_directory):
+
+    file_stats = {}
+
+    for ticker in tickers:
+        stat = os.stat(csv_directory + '{}.csv'.format(ticker))
+        file_stats[ticker] = [stat.st_size, stat.st_mtime]
+
+    return file_stats
+
+
+# FUNCTION TO IDENTIFY THE CLEANING OF THE CACHED PRICES BY THE DATA_CLEANING SOURCE CODE AND THE CLEANING ARGUMENTS
+def cleaning_fingerprint():
+
+    with open(data_cleaning.__file__, 'rb') as handle:
+        source = hashlib.sha256(handle.read()).hexdigest()
+
+    return {'source': source, 'arguments': dict(cleaning)}
+
+
+# FUNCTION TO DETERMINE IF THE CACHE WAS BUILT FROM THE CURRENT CSV FILES OF THE TICKERS WITH THE CURRENT CLEANING
+def is_current(tickers, csv_directory):
+
+    try:
+        with open(cache_directory + 'manifest.json', 'r') as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):  # no cache (or manifest was only partly written)
+        return False
+
+    return (manifest.get('version') == version and manifest['tickers'] == list(tickers) and
+            manifest['files'] == get_file_stats(tickers, csv_directory) and manifest.get('cleaning') == cleaning_fingerprint())
+
+
+# FUNCTION TO PARSE AND CLEAN THE CSV FILES OF THE TICKERS INTO THE CACHE
+def build(tickers, csv_directory):
+
+    if not os.path.exists(cache_directory):
+        os.makedirs(cache_directory)
+
+    file_stats = get_file_stats(tickers, csv_directory)  # stats before reading so changes while building are detected
+    cleaning_used = cleaning_fingerprint()
+
+    ticker_data = [pd.read_csv(csv_directory + '{}.csv'.format(ticker), index_col=0, parse_dates=['Date'])[columns] for ticker in tickers]
+
+    dates = ticker_data[0].index
+    for data in ticker_data[1:]:
+        dates = dates.union(data.index)  # all dates of all tickers
+
+    aligned = [data.reindex(dates) for data in ticker_data]  # nan on dates without data
+
+    values = np.stack([data[columns].values.astype(float) for data in aligned])  # tickers x dates x OHLCV array
+
+    # clean missing prices, price spikes, inconsistent highs and lows and zero volumes
+    report = data_cleaning.clean_data(values, tickers, **cleaning)
+    if report.values.sum() > 0:
+        print('Days cleaned:')
+        print(report[report.sum(axis=1) > 0])
+
+    arrays = {'prices': values,  # tickers x dates x OHLCV in one C ordered array so it is memory mapped as it is used
+              'dates': dates.values.astype('datetime64[ns]').astype(np.int64)}
+
+    # write each file to a temporary file first so other processes never read a partly written file
+
+    for name, array in arrays.items():
+        temporary_path = cache_directory + name + '.' + str(os.getpid()) + '.tmp.npy'
+        np.save(temporary_path, array)
+        os.replace(temporary_path, cache_directory + name + '.npy')
+
+    temporary_path = cache_directory + 'manifest.json.' + str(os.getpid()) + '.tmp'
+    with open(temporary_path, 'w') as handle:
+        json.dump({'version': version, 'tickers': list(tickers), 'files': file_stats, 'cleaning': cleaning_used}, handle)
+    os.replace(temporary_path, cache_directory + 'manifest.json')
+
+
+# FUNCTION TO LOAD THE CLEANED PRICES OF THE TICKERS - RETURNS {'prices': tickers x dates x OHLCV array, 'dates': DatetimeIndex}
+# the cache is built first if the csv files have changed, prices are a copy on write memory map of the cache file (pages
+# are read from the file when used and only copied if they are changed, the file itself is never changed)
+def load(tickers, csv_directory):
+
+    if not is_current(tickers, csv_directory):
+        build(tickers, csv_directory)
+        print('Price cache built')
+
+    prices = {'prices': np.load(cache_directory + 'prices.npy', mmap_mode='c')}
+    prices['dates'] = pd.DatetimeIndex(np.load(cache_directory + 'dates.npy'), name='Date')
+
+    return prices
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Build or clear the binary price cache')
+    parser.add_argument('command', choices=['build', 'clear'])
+    arguments = parser.parse_args()
+
+    if arguments.command == 'build':
+
+        # List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
+        indices_tickers = ['^GSPC', '^DJI', '^IXIC', '^NYA', '^XAX', '^BUK100P', '^RUT', '^FTSE', '^GDAXI', '^FCHI',
+                           '^STOXX50E', '^N100', '^BFX', 'IMOEX.ME', '^N225', '^HSI', '000001.SS', '^STI', '^AXJO', '^AORD',
+                           '^BSESN', '^JKSE', '^KLSE', '^NZ50', '^KS11', '^TWII', '^GSPTSE', '^BVSP', '^MXX', '^IPSA',
+                           '^MERV', '^TA125.TA', '^CASE30', '^JN0U.JO']
+
+        build(indices_tickers, 'World_indices_data/')
+        print('Price cache built')
+
+    else:
+        shutil.rmtree(cache_directory, ignore_errors=True)
+        print('Price cache cleared')
@@ -0,0 +1,92 @@
+# PROFILING OF MARKET CORRECTION STRATEGY PHASES
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Times the phases of handle_market_corrections on each bar:
+#   'history' - fetching prices from zipline, 'signals' - peaks, troughs, corrections and upturns,
+#   'ranking' - ranking and stacking positions, 'orders' - submitting orders
+# Profiling is off unless enable() is called, in which case start() returns None and lap() returns straight away,
+# so the calls can be left in the strategies for normal backtests. Usage in a strategy:
+#   timer = profiling.start()
+#   ... get history ...
+#   timer = profiling.lap('history', timer)
+
+import time
+import numpy as np
+import pandas as pd
+
+
+enabled = False  # profiling is off by default
+timings = {}  # seconds spent in each phase on each bar {phase: [seconds, ...]}
+
+
+# FUNCTION TO SWITCH ON PROFILING AND CLEAR PREVIOUS TIMINGS
+def enable():
+
+    global enabled
+
+    enabled = True
+    timings.clear()
+
+
+# FUNCTION TO SWITCH OFF PROFILING
+def disable():
+
+    global enabled
+
+    enabled = False
+
+
+# FUNCTION TO START TIMING A PHASE (returns None if profiling is off)
+def start():
+
+    if not enabled:
+        return None
+
+    return time.perf_counter()
+
+
+# FUNCTION TO RECORD THE TIME SINCE timer AGAINST A PHASE AND START TIMING THE NEXT PHASE
+def lap(phase, timer):
+
+    if timer is None:  # profiling is off
+        return None
+
+    now = time.perf_counter()
+
+    if phase not in timings:
+        timings[phase] = []
+    timings[phase].append(now - timer)
+
+    return now
+
+
+# FUNCTION TO SUMMARISE THE TIMINGS OF EACH PHASE (times in milliseconds)
+def summarise():
+
+    phases = ['history', 'signals', 'ranking', 'orders']
+    phases += sorted([phase for phase in timings.keys() if phase not in phases])  # any other timed phases
+    rows = []
+
+    for phase in phases:
+
+        if phase not in timings:  # phase is not used by the strategy
+            continue
+
+        phase_timings = np.array(timings[phase]) * 1000
+        rows.append([phase, len(phase_timings), phase_timings.sum(), phase_timings.mean(),
+                     np.percentile(phase_timings, 50), np.percentile(phase_timings, 95)])
+
+    return pd.DataFrame(rows, columns=['phase', 'bars', 'total', 'mean', 'p50', 'p95']).set_index('phase')
+
+
+# FUNCTION TO SAVE THE SUMMARY OF EACH PHASE TO THE BACKTEST DIRECTORY
+def dump(directory, file_name='profile.csv'):
+
+    summary = summarise()
+    summary.to_csv(directory + file_name)  # save summary to csv
+
+    print('PHASE TIMES (ms):')
+    print(summary.round(3))
+
+    return summary
@@ -0,0 +1,86 @@
+# EARLY TERMINATION OF BACKTESTS DURING OPTIMISATION
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# A PruningMonitor checks the portfolio value of a backtest at the end of each day and raises BacktestPruned if:
+#   - the drawdown from the highest portfolio value is more than max_drawdown
+#   - at a checkpoint (every checkpoint_days days) the total return is more than max_shortfall below the total return
+#     of the best finished backtest so far at the same checkpoint
+# The checkpoint returns of the best finished backtest are kept by PruningRules, which is updated with the checkpoint
+# returns of each backtest that finishes without being pruned (see optimisers.monte_carlo)
+
+
+# EXCEPTION RAISED TO STOP A BACKTEST
+class BacktestPruned(Exception):
+    pass
+
+
+# RULES FOR STOPPING BACKTESTS AND THE BEST RETURNS OF PREVIOUS BACKTESTS AT EACH CHECKPOINT
+class PruningRules:
+
+    def __init__(self, max_drawdown=None, max_shortfall=None, checkpoint_days=252):
+
+        self.max_drawdown = max_drawdown  # largest drawdown from peak portfolio value, e.g. 0.5 (None to not check)
+        self.max_shortfall = max_shortfall  # largest total return below the best at a checkpoint, e.g. 0.3 (None to not check)
+        self.checkpoint_days = checkpoint_days  # number of days between checkpoints
+        self.best_returns = []  # total return at each checkpoint of the best finished backtest
+
+    # FUNCTION TO UPDATE THE BEST RETURNS WITH THE CHECKPOINT RETURNS OF A FINISHED BACKTEST
+    # the best backtest is the one with the highest total return at its last checkpoint
+    def update(self, checkpoint_returns):
+
+        if len(checkpoint_returns) > 0 and (len(self.best_returns) == 0 or checkpoint_returns[-1] > self.best_returns[-1]):
+            self.best_returns = list(checkpoint_returns)
+
+
+# CHECKS THE PORTFOLIO VALUE OF ONE BACKTEST AT THE END OF EACH DAY
+class PruningMonitor:
+
+    def __init__(self, rules, capital_base):
+
+        self.rules = rules
+        self.capital_base = capital_base
+        self.values = []  # end of day portfolio values
+        self.peak_value = capital_base  # highest portfolio value
+        self.checkpoint_returns = []  # total return at each checkpoint
+
+    # FUNCTION TO CHECK TODAYS PORTFOLIO VALUE AGAINST THE RULES
+    def check(self, value):
+
+        self.values.append(value)
+        self.peak_value = max(self.peak_value, value)
+
+        drawdown = (self.peak_value - value) / self.peak_value
+        if self.rules.max_drawdown is not None and drawdown > self.rules.max_drawdown:
+            raise BacktestPruned('Drawdown of ' + str(round(drawdown*100, 2)) + '% on day ' + str(len(self.values)))
+
+        if len(self.values) % self.rules.checkpoint_days == 0:  # if today is a checkpoint
+
+            checkpoint = len(self.checkpoint_returns)
+            total_return = value / self.capital_base - 1
+            self.checkpoint_returns.append(total_return)
+
+            if self.rules.max_shortfall is not None and checkpoint < len(self.rules.best_returns):
+                if total_return < self.rules.best_returns[checkpoint] - self.rules.max_shortfall:
+                    raise BacktestPruned('Return of ' + str(round(total_return*100, 2)) + '% at checkpoint ' + str(checkpoint + 1))
+
+    # FUNCTION TO ADD THE CHECK TO THE END OF A ZIPLINE HANDLE_DATA FUNCTION
+    def wrap(self, handle_data):
+
+        def handle_data_with_pruning(context, data):
+
+            handle_data(context, data)
+            self.check(context.portfolio.portfolio_value)
+
+        return handle_data_with_pruning
+
+    # FUNCTION TO CALCULATE THE MEAN DAILY RETURN OF THE DAYS BACKTESTED
+    def mean_daily_return(self):
+
+        if len(self.values) == 0:
+            return 0.0
+
+        previous_values = [self.capital_base] + self.values[:-1]
+        returns = [(value - previous_values[i]) / previous_values[i] for i, value in enumerate(self.values)]
+
+        return sum(returns) / len(returns)
@@ -0,0 +1,210 @@
+# ON DISK CACHE OF BACKTEST RESULTS
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Results are saved as pickle files named by a hash of the strategy, parameters, timeframe, capital and the contents
+# of the CSV files of the tickers used, so a backtest is only run again if one of them changes. Loading a result
+# updates its modified time and the least recently used results are deleted when the cache is larger than max_size.
+#
+# TO INSPECT OR PRUNE THE CACHE USING COMMAND LINE INTERFACE:
+# python result_cache.py info
+# python result_cache.py prune --max_mb 500
+# python result_cache.py clear
+
+import os
+import hashlib
+import json
+import pickle
+import argparse
+import datetime as dt
+
+
+enabled = True  # check the cache before running backtests
+cache_directory = 'Result_cache/'  # folder of cached results
+csv_directory = 'World_indices_data/'  # folder of ticker data (see backtest.format_data)
+max_size = 1000 * 1024 * 1024  # largest size of the cache in bytes
+
+file_hashes = {}  # hashes of csv files already read {path: (size, modified time, hash)}
+
+
+# FUNCTION TO HASH THE CSV FILES OF THE TICKERS USED IN A BACKTEST
+def data_fingerprint(tickers):
+
+    fingerprint = hashlib.sha256()
+
+    for ticker in tickers:
+
+        path = csv_directory + '{}.csv'.format(ticker)
+        stat = os.stat(path)
+
+        # only read the file again if it has changed since it was last hashed
+        if path not in file_hashes or file_hashes[path][:2] != (stat.st_size, stat.st_mtime):
+            with open(path, 'rb') as handle:
+                file_hashes[path] = (stat.st_size, stat.st_mtime, hashlib.sha256(handle.read()).hexdigest())
+
+        fingerprint.update((ticker + ':' + file_hashes[path][2] + ';').encode())
+
+    return fingerprint.hexdigest()
+
+
+# FUNCTION TO IDENTIFY A STRATEGY BY ITS MODULES AND THEIR SOURCE CODE (results are not reused once the code changes)
+def strategy_fingerprint(modules):
+
+    fingerprint = []
+
+    for module in modules:
+        with open(module.__file__, 'rb') as handle:
+            fingerprint.append(module.__name__ + ':' + hashlib.sha256(handle.read()).hexdigest())
+
+    return ';'.join(fingerprint)
+
+
+# FUNCTION TO GET THE MODULES EVERY STRATEGY RUNS WITH (fingerprinted with the strategy module itself by backtest.py
+# and optimisers.get_cache_key so both cache keys change when any of them change)
+def strategy_modules():
+
+    import signals
+    import allocation
+    import rolling_extremum
+    import price_buffer
+
+    return [signals, allocation, rolling_extremum, price_buffer]
+
+
+# FUNCTION TO IDENTIFY THE DATA PIPELINE WHICH TURNS THE CSV FILES INTO BACKTEST DATA BY ITS SOURCE CODE
+# (results are not reused once the formatting, cleaning or price cache code changes, even if the csv files have not)
+def pipeline_fingerprint():
+
+    import backtest
+    import data_cleaning
+    import price_cache
+
+    return strategy_fingerprint([backtest, data_cleaning, price_cache])
+
+
+# FUNCTION TO CREATE THE CACHE KEY OF A BACKTEST
+def make_key(strategy, parameters, start, end, capital, tickers):
+
+    key = {'strategy': strategy,
+           'parameters': {name: float(value) for name, value in parameters.items()},
+           'start': str(start.date()),
+           'end': str(end.date()),
+           'capital': float(capital),
+           'data': data_fingerprint(tickers)}
+
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+# FUNCTION TO LOAD A CACHED RESULT (returns None if the result is not cached)
+def load(key):
+
+    if not enabled:
+        return None
+
+    path = cache_directory + key + '.pickle'
+
+    try:
+        with open(path, 'rb') as handle:
+            result = pickle.load(handle)
+    except (OSError, EOFError, pickle.UnpicklingError):  # result is not cached (or was only partly written)
+        return None
+
+    os.utime(path, None)  # mark result as recently used
+
+    return result
+
+
+# FUNCTION TO SAVE A RESULT TO THE CACHE
+def save(key, result):
+
+    if not enabled:
+        return
+
+    if not os.path.exists(cache_directory):
+        os.makedirs(cache_directory, exist_ok=True)
+
+    # write to a temporary file first so other processes never read a partly written result
+    path = cache_directory + key + '.pickle'
+    temporary_path = path + '.' + str(os.getpid()) + '.tmp'
+    with open(temporary_path, 'wb') as handle:
+        pickle.dump(result, handle)
+    os.replace(temporary_path, path)
+
+    prune(max_size)
+
+
+# FUNCTION TO LIST THE CACHED RESULTS AS (modified time, size, path) FROM LEAST TO MOST RECENTLY USED
+def get_entries():
+
+    if not os.path.exists(cache_directory):
+        return []
+
+    entries = []
+
+    for file_name in os.listdir(cache_directory):
+
+        if not file_name.endswith('.pickle'):
+            continue
+
+        path = cache_directory + file_name
+        try:
+            stat = os.stat(path)
+        except OSError:  # deleted by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    return sorted(entries)
+
+
+# FUNCTION TO DELETE THE LEAST RECENTLY USED RESULTS UNTIL THE CACHE IS NO LARGER THAN size BYTES
+def prune(size):
+
+    entries = get_entries()
+    total_size = sum([entry[1] for entry in entries])
+    no_of_deletions = 0
+
+    for modified_time, file_size, path in entries:
+
+        if total_size <= size:
+            break
+
+        try:
+            os.remove(path)
+        except OSError:  # deleted by another process
+            pass
+
+        total_size -= file_size
+        no_of_deletions += 1
+
+    return no_of_deletions
+
+
+# FUNCTION TO PRINT THE NUMBER, SIZE AND AGE OF THE CACHED RESULTS
+def info():
+
+    entries = get_entries()
+    total_size = sum([entry[1] for entry in entries])
+
+    print('Cache folder: ' + cache_directory)
+    print('Cached results: ' + str(len(entries)))
+    print('Cache size: ' + str(round(total_size / (1024 * 1024), 2)) + ' MB of ' + str(round(max_size / (1024 * 1024), 2)) + ' MB')
+
+    if len(entries) > 0:
+        print('Least recently used: ' + str(dt.datetime.fromtimestamp(entries[0][0])))
+        print('Most recently used: ' + str(dt.datetime.fromtimestamp(entries[-1][0])))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Inspect or prune the backtest result cache')
+    parser.add_argument('command', choices=['info', 'prune', 'clear'])
+    parser.add_argument('--max_mb', type=float, default=max_size / (1024 * 1024), help='size to prune the cache to')
+    arguments = parser.parse_args()
+
+    if arguments.command == 'info':
+        info()
+    elif arguments.command == 'prune':
+        print('Deleted ' + str(prune(arguments.max_mb * 1024 * 1024)) + ' results')
+        info()
+    else:
+        print('Deleted ' + str(prune(0)) + ' results')
@@ -0,0 +1,78 @@
+# COLUMNAR STORE OF OPTIMISATION RESULTS
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Results are written into preallocated numpy columns (doubled in size when full) and the rows with the top k values
+# of each objective are kept in a heap as they are added, so the best parameter set can be found without sorting all
+# results. to_dict() gives the results dict used by optimize.format_results (most recent result first).
+
+import heapq
+import numpy as np
+
+
+# PREALLOCATED COLUMNS OF RESULTS WITH A TOP K INDEX FOR EACH OBJECTIVE
+class ResultStore:
+
+    def __init__(self, columns, objectives=('mean_daily_return', 'alpha'), capacity=1024, k=10):
+
+        self.columns = list(columns)  # names of columns e.g. mean_daily_return, alpha, parameter names, pruned
+        self.data = {column: np.zeros(capacity, dtype=bool if column == 'pruned' else float) for column in self.columns}
+        self.size = 0  # number of results stored
+        self.k = k  # number of best rows kept for each objective
+        self.top_rows = {objective: [] for objective in objectives}  # min heaps of (value, row) for each objective
+
+    def __len__(self):
+
+        return self.size
+
+    # FUNCTION TO ADD A RESULT {column: value} (must have a value for every column and no others)
+    def append(self, result):
+
+        if set(result.keys()) != set(self.columns):  # every row must have the same columns
+            raise ValueError('Result columns ' + str(sorted(result.keys())) + ' do not match the columns of the store ' + str(sorted(self.columns)))
+
+        if self.size == len(self.data[self.columns[0]]):  # double the size of the columns if they are full
+            for column in self.columns:
+                self.data[column] = np.concatenate([self.data[column], np.zeros_like(self.data[column])])
+
+        row = self.size
+        for column in self.columns:
+            self.data[column][row] = result[column]
+        self.size += 1
+
+        if 'pruned' in result and result['pruned']:  # results of backtests stopped early are not ranked
+            return
+
+        # add the row to the top k of each objective
+        for objective, top_rows in self.top_rows.items():
+
+            value = float(result[objective])
+            if np.isnan(value):
+                continue
+
+            if len(top_rows) < self.k:
+                heapq.heappush(top_rows, (value, row))
+            elif value > top_rows[0][0]:  # replace the lowest of the top k
+                heapq.heapreplace(top_rows, (value, row))
+
+    # FUNCTION TO GET THE ROWS WITH THE HIGHEST VALUES OF AN OBJECTIVE (highest first, earliest row first for ties)
+    def top(self, objective):
+
+        return [row for value, row in sorted(self.top_rows[objective], key=lambda entry: (-entry[0], entry[1]))]
+
+    # FUNCTION TO GET THE ROW WITH THE HIGHEST VALUE OF AN OBJECTIVE (None if there are no ranked results)
+    def best(self, objective):
+
+        top_rows = self.top(objective)
+
+        return top_rows[0] if len(top_rows) > 0 else None
+
+    # FUNCTION TO GET THE VALUE OF A COLUMN IN A ROW
+    def get(self, column, row):
+
+        return self.data[column][row]
+
+    # FUNCTION TO EXPORT THE RESULTS AS A DICT OF LISTS (most recent result first)
+    def to_dict(self):
+
+        return {column: self.data[column][:self.size][::-1].tolist() for column in self.columns}
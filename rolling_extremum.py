@@ -0,0 +1,99 @@
+# ROLLING PEAK AND TROUGH STATE FOR MARKET CORRECTION STRATEGY
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Keeps the peak of the last 'window' prices, the number of days since that peak and the trough since the peak
+# for a single index, updated with one price per bar in amortised O(1) (monotonic deques) so the cost per bar
+# does not depend on the length of the look back window
+
+from collections import deque
+import math
+
+
+# ROLLING EXTREMUM STATE FOR ONE INDEX
+class RollingExtremum:
+
+    def __init__(self, window):
+
+        self.window = window  # number of previous prices (bar_days)
+        self.day = -1  # number of the latest day added
+        self.price = float('nan')  # latest price
+        self.maxima = deque()  # (day, price) pairs with falling prices - first pair is the peak of the window
+        self.minima = deque()  # (day, price) pairs with rising prices - first pair is the trough since the peak
+
+    # FUNCTION TO ADD TODAYS PRICE (optionally changing the number of prices in the window, which may only shrink
+    # the window from the oldest end - e.g. the prices since an investment when its holding period is not counted)
+    def update(self, price, window=None):
+
+        if window is not None:
+            self.window = window
+
+        self.day += 1  # move on one day
+        self.price = price  # save todays price
+
+        if not math.isnan(price):  # missing prices are ignored like pandas max and min
+
+            while len(self.maxima) > 0 and self.maxima[-1][1] <= price:  # remove earlier prices no higher than today
+                self.maxima.pop()
+            self.maxima.append((self.day, price))
+
+            while len(self.minima) > 0 and self.minima[-1][1] >= price:  # remove earlier prices no lower than today
+                self.minima.pop()
+            self.minima.append((self.day, price))
+
+        while len(self.maxima) > 0 and self.maxima[0][0] <= self.day - self.window:  # remove prices outside window
+            self.maxima.popleft()
+
+        if len(self.maxima) > 0:  # remove prices before the peak
+            while self.minima[0][0] < self.maxima[0][0]:
+                self.minima.popleft()
+
+    # PEAK PRICE OF THE WINDOW (nan if there are no prices in the window)
+    @property
+    def peak(self):
+
+        return self.maxima[0][1] if len(self.maxima) > 0 else float('nan')
+
+    # NUMBER OF DAYS SINCE THE MOST RECENT PEAK, TODAY = 1 (-1 if there is no price today)
+    @property
+    def peak_age(self):
+
+        return self.day - self.maxima[0][0] + 1 if not math.isnan(self.price) else -1
+
+    # LOWEST PRICE SINCE THE PEAK (-1 if there is no price today)
+    @property
+    def trough(self):
+
+        return self.minima[0][1] if not math.isnan(self.price) else -1
+
+
+# FUNCTION TO UPDATE THE TROUGH OF EACH INDEX SINCE THE START OF ITS CORRECTION WITH TODAYS PRICES
+# the trough is the lowest of the last days_of_correction prices including today (-1 if not correcting), and as the
+# number of days grows by one each day of a correction only the previous trough and todays price need comparing
+def update_correction_troughs(troughs, prices, days_of_correction):
+
+    return [-1 if days == 0 else prices[i] if days == 1 else min(troughs[i], prices[i]) for i, days in enumerate(days_of_correction)]
+
+
+# FUNCTION TO CREATE A ROLLING EXTREMUM FROM A PRICE HISTORY (e.g. data.history on the first day of a backtest)
+def from_history(history, window):
+
+    extremum = RollingExtremum(window)  # initialise state
+
+    for price in history:  # add prices oldest to newest
+        extremum.update(price)
+
+    return extremum
+
+
+# FUNCTION TO UPDATE ONE ROLLING EXTREMUM PER INDEX FROM THE PRICE BUFFER (see price_buffer) AND STORE THEM ON CONTEXT
+def update_extrema(context, prices, window):
+
+    if context.extrema is None:  # if this is the first day of the backtest fill the window from history
+        history = prices.window(window).T  # each row is the price history of one index
+        context.extrema = [from_history(history[i], window) for i in range(len(context.indices))]
+    else:  # otherwise only todays price is needed
+        for extremum, price in zip(context.extrema, prices.latest().tolist()):
+            extremum.update(price)
+
+    return context.extrema
@@ -0,0 +1,74 @@
+# DATA PANEL AND MARKET ARRAYS SHARED BETWEEN PROCESSES AS MEMORY MAPPED FILES
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# publish() writes the price values of the data panel and the arrays of the fast engine market data to .npy files
+# ONCE and returns a small layout (file names, axes and other values) which is sent to the worker processes instead of
+# the data. attach() memory maps the files read only, so every process reads the same pages of the operating system
+# page cache and the memory used by each worker does not grow with the number of processes.
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+enabled = True  # share data with worker processes through memory mapped files (False to send each process a copy)
+
+
+# FUNCTION TO WRITE THE DATA PANEL AND MARKET ARRAYS TO A FOLDER AND RETURN THEIR LAYOUT
+def publish(panel, market=None, directory=None):
+
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='shared_panel_')  # temporary folder (deleted by release)
+    elif not os.path.exists(directory):
+        os.makedirs(directory)
+
+    layout = {'directory': directory, 'panel': None, 'market': None}
+
+    if panel is not None:  # save prices as one items x dates x fields array
+        np.save(os.path.join(directory, 'panel.npy'), np.ascontiguousarray(panel.values, dtype=float))
+        layout['panel'] = {'items': list(panel.items),
+                           'major_axis': panel.major_axis,
+                           'minor_axis': list(panel.minor_axis)}
+
+    if market is not None:  # save each array of the market data, other values are kept in the layout
+        layout['market'] = {}
+        for key, value in market.items():
+            if isinstance(value, np.ndarray):
+                np.save(os.path.join(directory, 'market_' + key + '.npy'), value)
+                layout['market'][key] = None
+            else:
+                layout['market'][key] = value
+
+    return layout
+
+
+# FUNCTION TO MEMORY MAP THE DATA PANEL AND MARKET ARRAYS OF A LAYOUT (returns panel, market)
+def attach(layout):
+
+    directory = layout['directory']
+    panel = None
+    market = None
+
+    if layout['panel'] is not None:
+        values = np.load(os.path.join(directory, 'panel.npy'), mmap_mode='r')  # read only view of the file
+        panel = pd.Panel(values, items=layout['panel']['items'], major_axis=layout['panel']['major_axis'],
+                         minor_axis=layout['panel']['minor_axis'])
+
+    if layout['market'] is not None:
+        market = {}
+        for key, value in layout['market'].items():
+            if value is None:  # array saved to file
+                market[key] = np.load(os.path.join(directory, 'market_' + key + '.npy'), mmap_mode='r')
+            else:
+                market[key] = value
+
+    return panel, market
+
+
+# FUNCTION TO DELETE THE FILES OF A LAYOUT ONCE NO PROCESS IS USING THEM
+def release(layout):
+
+    shutil.rmtree(layout['directory'], ignore_errors=True)
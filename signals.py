@@ -0,0 +1,161 @@
+# SIGNAL ENGINE FOR MARKET CORRECTION STRATEGY
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Computes the peaks, days since peaks, troughs and market state of every index ONCE per backtest as
+# dates x tickers arrays, so the strategies only have to read a single row per bar
+
+import pickle
+import numpy as np
+import pandas as pd
+from trading_calendars import get_calendar
+import rolling_extremum
+
+
+# FUNCTION TO BUILD A DATES x TICKERS MATRIX OF CLOSE PRICES ON THE TRADING CALENDAR (nan on days without a bar)
+def get_close_matrix(panel, tickers, calendar_name='NYSE'):
+
+    closes = panel.minor_xs('close')[tickers]  # close prices for each ticker in ticker order
+    sessions = get_calendar(calendar_name).sessions_in_range(closes.index[0], closes.index[-1])  # sessions zipline steps through
+
+    return closes.reindex(sessions)
+
+
+# FUNCTION TO BUILD A DATES x TICKERS MATRIX OF DAILY PRICES FROM THE DATA PANEL
+def get_price_matrix(panel, tickers, calendar_name='NYSE'):
+
+    return get_close_matrix(panel, tickers, calendar_name).ffill()  # forward fill missing days the same as the zipline 'price' field
+
+
+# FUNCTION TO SHIFT THE ROWS OF A MATRIX DOWN BY A NUMBER OF DAYS (EQUIVALENT TO LOOKING BACK IN HISTORY)
+def shift(values, days):
+
+    shifted = np.full(values.shape, np.nan)  # days before the start of the data are unknown
+
+    if days < len(values):
+        shifted[days:] = values[:len(values) - days]
+
+    return shifted
+
+
+# FUNCTION TO CALCULATE THE SIGNALS WHICH DO NOT DEPEND ON THE STRATEGY PARAMETERS
+def compute_signals(prices, bar_days=500):
+
+    values = prices.values.astype(float)  # dates x tickers array of prices
+    no_of_days, no_of_tickers = values.shape
+
+    peaks = np.full(values.shape, np.nan)  # initialise signal arrays
+    days_since_peaks = np.full(values.shape, -1, dtype=int)
+    troughs = np.full(values.shape, -1.0)
+
+    for i in range(no_of_tickers):  # iterate through tickers
+
+        extremum = rolling_extremum.RollingExtremum(bar_days)  # rolling peak and trough over the last bar_days prices
+
+        for day, price in enumerate(values[:, i].tolist()):  # step through days adding one price at a time
+            extremum.update(price)
+            peaks[day, i] = extremum.peak
+            days_since_peaks[day, i] = extremum.peak_age
+            troughs[day, i] = extremum.trough
+
+    # determine previous 10 day average of daily percentage changes
+    five_prev_days_avg = np.zeros(values.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for n in range(10):
+            five_prev_days_avg = five_prev_days_avg + (shift(values, 9-n) - shift(values, 10-n)) / shift(values, 10-n)
+    five_prev_days_avg = five_prev_days_avg / 10
+    five_prev_days_avg[np.isnan(shift(values, 9))] = -99.9  # index not yet available
+
+    return {'dates': prices.index,
+            'tickers': list(prices.columns),
+            'prices': values,
+            'peaks': peaks,
+            'days_since_peaks': days_since_peaks,
+            'troughs': troughs,
+            'five_prev_days_avg': five_prev_days_avg,
+            'critical_upturn_coefficients': compute_critical_upturn_coefficients(values, peaks, troughs)}
+
+
+# FUNCTION TO CALCULATE THE LARGEST UPTURN COEFFICIENT AT WHICH EACH INDEX IS UPTURNING FOR ALL DAYS
+# price >= (1 + ((c*100*drawdown)**2)/100) * trough  <=>  c <= sqrt((price/trough - 1)/100) / drawdown
+# so the upturns of any upturn coefficient are found by comparing it with this matrix (see compute_upturns)
+def compute_critical_upturn_coefficients(prices, peaks, troughs):
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdowns = (peaks-troughs)/peaks  # drawdown of trough from peak
+        rises = prices/troughs - 1  # increase of price from trough
+        critical = np.sqrt(rises/100)/drawdowns
+
+    critical[drawdowns == 0] = np.inf  # no upturn required if the trough is the peak
+    critical[~(rises >= 0) | ~(troughs > 0)] = -np.inf  # never upturning below the trough or without a trough
+
+    return critical
+
+
+# FUNCTION TO CALCULATE SIGNALS FROM DATA PANEL AND SAVE THEM FOR THE STRATEGY INITIALIZE FUNCTION
+def save_signals(panel, tickers, signals_file, bar_days=500):
+
+    signals = compute_signals(get_price_matrix(panel, tickers), bar_days)  # calculate signals once for all backtests
+
+    with open(signals_file, 'wb') as handle:
+        pickle.dump(signals, handle)  # pickle signals
+
+    return signals
+
+
+# FUNCTION TO IDENTIFY CORRECTING INDICES FOR ALL DAYS
+def compute_corrections(signals, correction_margin, min_gain):
+
+    prices = signals['prices']
+    peaks = signals['peaks']
+    troughs = signals['troughs']
+
+    with np.errstate(invalid='ignore'):
+        correcting = (prices <= peaks*(1-min_gain)) & (0 < troughs) & (troughs <= (1-correction_margin)*peaks)
+        corrections = np.where(correcting, 1-(peaks-prices)/peaks, -1.0)
+
+    return corrections
+
+
+# FUNCTION TO IDENTIFY INCREASE FROM TROUGH OF CORRECTION FOR ALL DAYS (PERCENTAGE CHANGE FROM TROUGH)
+def compute_upturns(signals, corrections, upturn_coefficient):
+
+    prices = signals['prices']
+    peaks = signals['peaks']
+    troughs = signals['troughs']
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+
+        if 'critical_upturn_coefficients' in signals:  # compare with the precalculated largest upturn coefficients
+
+            critical = signals['critical_upturn_coefficients']
+            upturning = (corrections > 0) & (critical >= upturn_coefficient)
+
+            # check the required upturn exactly where rounding could change the comparison
+            near = np.abs(critical - upturn_coefficient) <= 1e-9 * np.abs(upturn_coefficient)
+            if np.any(near):
+                required_upturn = 1 + (((upturn_coefficient * 100 * ((peaks-troughs)/peaks)) ** 2) / 100)
+                upturning = np.where(near, (corrections > 0) & (prices >= required_upturn*troughs), upturning)
+
+        else:
+            required_upturn = 1 + (((upturn_coefficient * 100 * ((peaks-troughs)/peaks)) ** 2) / 100)
+            upturning = (corrections > 0) & (prices >= required_upturn*troughs)
+
+        upturns = np.where(upturning, (prices-troughs)/troughs, -1.0)
+
+    return upturns
+
+
+# FUNCTION TO DETERMINE WHICH INDICES ARE CONSIDERED FOR ORDERING FOR ALL DAYS
+def compute_consider(signals, state_threshold):
+
+    with np.errstate(invalid='ignore'):
+        consider = signals['five_prev_days_avg'] > state_threshold
+
+    return consider
+
+
+# FUNCTION TO GET THE ROW OF THE SIGNAL ARRAYS FOR A GIVEN DAY
+def get_row(signals, date):
+
+    return signals['dates'].get_loc(pd.Timestamp(date).normalize())
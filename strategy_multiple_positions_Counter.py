@@ -14,7 +14,10 @@ from zipline.finance import commission
 import pickle
 import math
 import os
-import numpy as np
+import allocation
+import rolling_extremum
+import price_buffer
+import profiling
 
 
 # ZIPLINE INITIALIZE FUNCTION (runs once at start of backtest)
@@ -28,6 +31,9 @@ def initialize(context):
 
     context.indices = [symbol(ticker) for ticker in indices_tickers]  # create list of ticker symbols
     context.days_of_correction = [0 for _ in indices_tickers]  # create list of days since correction has begun
+    context.troughs = [-1 for _ in indices_tickers]  # create list of troughs since correction has begun
+    context.extrema = None  # rolling peak state for each index, created on the first day (see rolling_extremum)
+    context.price_buffer = None  # last bar_days prices of each index, created on the first day (see price_buffer)
     set_benchmark(symbol('^GSPC'))
     set_commission(commission.PerTrade(cost=15.0))  # commission for IBKR, UK for Stocks, ETF's & Warrants - https://www.interactivebrokers.co.uk/en/index.php?f=39753&p=stocks1
 
@@ -46,10 +52,12 @@ def initialize(context):
 def handle_market_corrections(context, data):
 
     bar_days = 500  # number of previous prices
+    timer = profiling.start()  # time history and signals (see profiling)
 
-    # create list of each ticker for last 300 days price and get the data for correcting indices since the correction start
-    history = [data.history(context.indices[i], 'price', bar_days, '1d') for i in range(len(context.indices))]
-    correction_history = [data.history(context.indices[i], 'price', context.days_of_correction[i], '1d') if context.days_of_correction[i] > 0 else 0 for i in range(len(context.indices))]
+    # update the last bar_days prices of each ticker and read the last 11 days needed for the 10 day average
+    buffer = price_buffer.update_price_buffer(context, data, bar_days)
+    history = buffer.window(11).T  # each row is the last 11 prices of one index
+    timer = profiling.lap('history', timer)
 
     # calculate average weekly prices across all indices to determine market direction
     '''first_week = [sum([(history[i][-7+n]-history[i][-8+n])/history[i][-8+n] for n in range(7)])/7 for i in range(len(context.indices)) if not math.isnan(history[i][-29])]
@@ -70,10 +78,12 @@ def handle_market_corrections(context, data):
     # consider = [True if first_week[i] > context.state_threshold and second_week[i] > context.state_threshold and third_week[i] > context.state_threshold and fourth_week[i] > context.state_threshold and first_week != 999.9 else False for i in range(len(context.indices))]
     consider = [True if five_prev_days_avg[i] > context.state_threshold else False for i in range(len(context.indices))]
 
-    # create lists of troughs, peaks and todays prices
-    troughs = [correction_history[i].min() if type(correction_history[i]) != int else -1 for i in range(len(context.indices))]
-    peaks = [history[i].max() for i in range(len(context.indices))]
-    prices = [history[i][-1] for i in range(len(context.indices))]
+    # create lists of todays prices, troughs and peaks
+    prices = buffer.latest().tolist()
+    context.troughs = rolling_extremum.update_correction_troughs(context.troughs, prices, context.days_of_correction)  # update troughs of correcting indices with todays prices
+    troughs = context.troughs
+    extrema = rolling_extremum.update_extrema(context, buffer, bar_days)  # update rolling peak of each index with todays price
+    peaks = [extremum.peak for extremum in extrema]
 
     # determine number of and price of shares held for each index
     no_of_shares = [context.portfolio.positions[index].amount for index in context.indices]
@@ -85,6 +95,8 @@ def handle_market_corrections(context, data):
     # create list to identify increase from trough of correction (percentage change from trough)
     upturns = [(prices[i]-troughs[i])/troughs[i] if troughs[i] > 0 and prices[i] >= calculate_required_upturn(peaks[i], troughs[i], context.upturn_coefficient)*troughs[i] else -1 for i in range(len(context.indices))]
 
+    profiling.lap('signals', timer)
+
     # if the market is bear
     '''if first_week < context.state_threshold and second_week < context.state_threshold and third_week < context.state_threshold and fourth_week < context.state_threshold:
 
@@ -112,10 +124,7 @@ def determine_best_positions(peaks, prices, upturns, indices, consider):
 
     # determine potential gains for each upturning index ~ and consider[i] is True ~ ADD TO POTENTIAL GAINS LIST COMPREHENSION FOR INDIVIDUAL INDICES STATES
     potential_gains = [(peaks[i]-prices[i]/prices[i]) if upturns[i] > 0 and consider[i] is True else -1 for i in range(len(prices))]
-    shortened_gains = [gain for gain in potential_gains if gain > 0]  # remove indices with insufficient gain
-    ranked_gains = sorted(shortened_gains, reverse=True)  # rank gains from highest to lowest
-    ranked_symbol_indices = [potential_gains.index(ranked_gain) for ranked_gain in ranked_gains]  # determine index in list of best potential gain
-    ranked_symbols = [indices[ranked_symbol_index] for ranked_symbol_index in ranked_symbol_indices]  # determine symbol with best potential gain
+    ranked_symbols, ranked_symbol_indices = allocation.rank_positions(potential_gains, indices)  # rank gains from highest to lowest
 
     return ranked_symbols, ranked_symbol_indices  # return the best symbol and its associated list index
 
@@ -134,19 +143,12 @@ def stack_portfolio(peaks, prices, upturns, context, consider):
     else:  # if there are potential positions
 
         value = context.portfolio.portfolio_value  # set value variable
-        i = 0  # set counter to 0
-
-        while value > min(ranked_prices):  # iterate through symbol ranking
-
-            if prices[ranked_symbol_indices[i]] < value:  # determine if the price is less than our current disposable value
 
-                symbol_orders[ranked_symbol_indices[i]] += 1  # add one to order
-                value -= math.ceil(prices[ranked_symbol_indices[i]])  # take away price from value
+        # cycle through symbol ranking buying one share of each symbol cheaper than our current disposable value
+        ranked_shares = allocation.allocate_shares(ranked_prices, value)
 
-            if i < len(ranked_symbols) - 1:  # if we are not at the end of ranking
-                i += 1  # increase counter by 1
-            else:  # if end of ranking has been reached
-                i = 0  # set counter to 0
+        for i, shares in enumerate(ranked_shares):  # add shares to orders
+            symbol_orders[ranked_symbol_indices[i]] += shares
 
     return symbol_orders  # return the orders to be issued
 
@@ -154,9 +156,13 @@ def stack_portfolio(peaks, prices, upturns, context, consider):
 # FUNCTION TO ISSUE ORDERS TO REACH OPTIMAL PORTFOLIO
 def order_stack(peaks, prices, upturns, indices, context, no_of_shares, consider):
 
+    timer = profiling.start()  # time ranking and orders (see profiling)
+
     stack = stack_portfolio(peaks, prices, upturns, context, consider)  # determine optimal stack
     orders = [0 for _ in prices]  # initialise order share amounts
 
+    timer = profiling.lap('ranking', timer)
+
     for i, shares in enumerate(stack):  # iterate through stack for sells
 
         orders[i] = shares - no_of_shares[i]  # determine the order amount
@@ -170,3 +176,5 @@ def order_stack(peaks, prices, upturns, indices, context, no_of_shares, consider
         if order > 0:  # if the order amount is positive
 
             Order(indices[i], order)  # execute buys
+
+    profiling.lap('orders', timer)
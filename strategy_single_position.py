@@ -11,6 +11,10 @@
 from zipline.api import order_target_percent, record, symbol, set_benchmark, get_open_orders
 import pickle
 import os
+import rolling_extremum
+import price_buffer
+import allocation
+import profiling
 
 
 # ZIPLINE INITIALIZE FUNCTION (runs once at start of backtest)
@@ -24,6 +28,8 @@ def initialize(context):
 
     context.indices = [symbol(ticker) for ticker in indices_tickers]  # create list of ticker symbols
     context.days_of_correction = [0 for _ in indices_tickers]  # create list of days since correction has begun
+    context.extrema = None  # rolling peak state for each index, created on the first day (see rolling_extremum)
+    context.price_buffer = None  # last bar_days prices of each index, created on the first day (see price_buffer)
     set_benchmark(symbol('^GSPC'))
 
     '''-----------------------------PARAMETERS TO BE OPTIMISED--------------------------------'''
@@ -42,23 +48,29 @@ def initialize(context):
 # ZIPLINE HANDLE_DATA FUNCTION (runs according to data frequency set for backtest variable assignment)
 def handle_market_corrections(context, data):
 
-    # create list of each ticker for last 300 days price and get the data for correcting indices since the correction start
-    history = [data.history(context.indices[i], 'price', 500, '1d') for i in range(len(context.indices))]
-    correction_history = [data.history(context.indices[i], 'price', context.days_of_correction[i], '1d') if context.days_of_correction[i] > 0 else 0 for i in range(len(context.indices))]
+    bar_days = 500  # number of previous prices
+    timer = profiling.start()  # time each phase (see profiling)
+
+    # create list of each ticker for last bar_days prices and get the data for correcting indices since the correction start
+    buffer = price_buffer.update_price_buffer(context, data, bar_days)
+    history = buffer.window(min(max(context.days_of_correction), bar_days)).T  # each row is the prices of one index over the longest correction
+    correction_history = [get_correction_history(context, data, history, i, bar_days) if context.days_of_correction[i] > 0 else 0 for i in range(len(context.indices))]
+    timer = profiling.lap('history', timer)
 
     # create lists of troughs, peaks and todays prices
     troughs = [correction_history[i].min() if type(correction_history[i]) != int else -1 for i in range(len(context.indices))]
-    peaks = [history[i].max() for i in range(len(context.indices))]
-    prices = [history[i][-1] for i in range(len(context.indices))]
+    extrema = rolling_extremum.update_extrema(context, buffer, bar_days)  # update rolling peak of each index with todays price
+    peaks = [extremum.peak for extremum in extrema]
+    prices = buffer.latest().tolist()
 
     # determine number of and price of shares held for each index
     no_of_shares = [context.portfolio.positions[index].amount for index in context.indices]
 
     if sum(no_of_shares) > 0:  # if we have an open position
 
-        # get prices since investment
-        investment_prices = data.history(context.bought_symbol, 'price', context.days_since_investment, '1d')
-        peak_investment_price = max(investment_prices)  # determine peak price of investment
+        # update peak price of investment (peak of the last days_since_investment prices) with todays price
+        context.investment_extremum.update(prices[context.bought_list_index], window=context.days_since_investment)
+        peak_investment_price = context.investment_extremum.peak  # determine peak price of investment
 
     # create list to identify correcting indices and update the days since corrections
     corrections = [1-(peaks[i]-prices[i])/peaks[i] if prices[i] <= peaks[i]*(1-context.min_gain) and troughs[i] <= (1-context.correction_margin)*peaks[i] else -1 for i in range(len(context.indices))]
@@ -66,11 +78,13 @@ def handle_market_corrections(context, data):
 
     # create list to identify increase from trough of correction (percentage change from trough)
     upturns = [(prices[i]-troughs[i])/troughs[i] if troughs[i] > 0 and prices[i] >= calculate_required_upturn(peaks[i], troughs[i], context.upturn_coefficient)*troughs[i] else -1 for i in range(len(context.indices))]
+    timer = profiling.lap('signals', timer)
 
     # if there exists at least one upturning index
     if max(upturns) > 0 and len(get_open_orders()) == 0:
         # determine rank of positions and their list locations
         ranked_symbols, ranked_symbol_indices = determine_best_position(peaks, prices, upturns, context.indices)
+        timer = profiling.lap('ranking', timer)
 
         for i, symbol in enumerate(ranked_symbols):   # iterate through symbol ranking
 
@@ -81,6 +95,7 @@ def handle_market_corrections(context, data):
                 context.buy_price = prices[ranked_symbol_indices[i]]  # save buy_price
                 context.bought_list_index = ranked_symbol_indices[i]  # save list index of bought symbol
                 context.days_since_investment = 1  # initialise number of days investment has been held
+                context.investment_extremum = rolling_extremum.RollingExtremum(1)  # reset peak price of investment
                 break
 
             # OTHERWISE, if we are not currently holding the best index and have met the minimum return requirement per position and can afford to buy
@@ -91,6 +106,7 @@ def handle_market_corrections(context, data):
                 context.buy_price = prices[ranked_symbol_indices[i]]  # save buy_price
                 context.bought_list_index = ranked_symbol_indices[i]  # save list index of bought symbol
                 context.days_since_investment = 1  # initialise number of days investment has been held
+                context.investment_extremum = rolling_extremum.RollingExtremum(1)  # reset peak price of investment
                 break
 
             elif symbol is context.bought_symbol:  # if the current position is the best position stop looking through ranking
@@ -104,6 +120,17 @@ def handle_market_corrections(context, data):
         if prices[context.bought_list_index] < context.stop_loss * peak_investment_price and context.bought_symbol not in get_open_orders():
             order_target_percent(context.bought_symbol, 0.0)  # neutralise position
 
+    profiling.lap('orders', timer)
+
+
+# FUNCTION TO GET THE PRICES OF AN INDEX SINCE THE START OF ITS CORRECTION
+def get_correction_history(context, data, history, i, bar_days):
+
+    if context.days_of_correction[i] <= bar_days:  # if the correction is within the price buffer
+        return history[i][-context.days_of_correction[i]:]
+    else:  # if the correction is longer than the price buffer
+        return data.history(context.indices[i], 'price', context.days_of_correction[i], '1d').values
+
 
 # FUNCTION TO CALCULATE THE REQUIRED RETURN BASED ON THE TROUGH, PEAK AND UPTURN COEFFICIENT
 def calculate_required_upturn(peak, trough, upturn_coefficient):
@@ -120,10 +147,7 @@ def determine_best_position(peaks, prices, upturns, indices):
 
     # determine potential gains for each upturning index
     potential_gains = [(peaks[i]-prices[i]/prices[i]) if upturns[i] > 0 else -1 for i in range(len(prices))]
-    shortened_gains = [gain for gain in potential_gains if gain > 0]  # remove indices with insufficient gain
-    ranked_gains = sorted(shortened_gains, reverse=True)  # rank gains from highest to lowest
-    ranked_symbol_indices = [potential_gains.index(ranked_gain) for ranked_gain in ranked_gains]  # determine index in list of best potential gain
-    ranked_symbols = [indices[ranked_symbol_index] for ranked_symbol_index in ranked_symbol_indices]  # determine symbol with best potential gain
+    ranked_symbols, ranked_symbol_indices = allocation.rank_positions(potential_gains, indices)  # rank gains from highest to lowest
 
     return ranked_symbols, ranked_symbol_indices  # return the best symbol and its associated list index
 
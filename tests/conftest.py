@@ -0,0 +1,13 @@
+# TEST CONFIGURATION
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# The scripts live in the top folder of the repository, so it is added to the import path for the tests
+#
+# TO RUN THE TESTS USING COMMAND LINE INTERFACE:
+# python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
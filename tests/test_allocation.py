@@ -0,0 +1,66 @@
+# PROPERTY TEST OF THE SHARE ALLOCATION
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# allocation.allocate_shares must give the same shares as the original stack_portfolio loop, which cycled through the
+# ranking buying one share of each affordable symbol per loop iteration until value dropped below the cheapest price
+
+import math
+import random
+import pytest
+
+import allocation
+
+
+# ORIGINAL STACK_PORTFOLIO LOOP - ONE SHARE PER ITERATION
+def greedy_shares(ranked_prices, value):
+
+    shares = [0 for _ in ranked_prices]
+    i = 0
+
+    while value > min(ranked_prices):
+
+        if ranked_prices[i] < value:
+            shares[i] += 1
+            value -= math.ceil(ranked_prices[i])
+
+        if i < len(ranked_prices) - 1:
+            i += 1
+        else:
+            i = 0
+
+    return shares
+
+
+@pytest.mark.parametrize('ranked_prices, value', [
+    ([100.0, 250.5, 3000.0], 0.0),  # zero cash
+    ([100.0, 250.5, 3000.0], -50.0),  # negative cash
+    ([5000.0, 7250.25, 3100.0], 3000.0),  # every price above cash
+    ([3000.0, 4000.0], 3000.0),  # cheapest price equal to cash
+    ([1234.5, 1234.5, 1234.5], 1000000.0),  # tied prices
+    ([99.2, 99.2, 350.0, 99.2], 12345.6),  # tied prices with a dearer symbol between them
+    ([7.0, 7.0], 14.0),  # tied whole number prices using up all cash
+    ([1500.0], 10000000.0),  # one symbol
+])
+def test_edge_cases(ranked_prices, value):
+
+    assert allocation.allocate_shares(ranked_prices, value) == greedy_shares(ranked_prices, value)
+
+
+def test_random_prices_and_cash():
+
+    rng = random.Random(4)
+
+    for _ in range(3000):
+
+        no_of_symbols = rng.randint(1, 10)
+        scale = rng.choice([10, 100, 1000, 30000])
+        ranked_prices = [rng.choice([rng.uniform(0.5, scale), float(rng.randint(1, scale))]) for _ in range(no_of_symbols)]
+
+        if rng.random() < 0.3:  # ties
+            ranked_prices[rng.randrange(no_of_symbols)] = ranked_prices[0]
+
+        value = rng.choice([0.0, rng.uniform(0, 50), rng.uniform(0, 2e4), float(rng.randint(0, 20000)),
+                            rng.uniform(0, 100) * scale, min(ranked_prices) * rng.uniform(0.5, 1.5)])
+
+        assert allocation.allocate_shares(ranked_prices, value) == greedy_shares(ranked_prices, value), (ranked_prices, value)
@@ -0,0 +1,51 @@
+# PARITY TEST OF THE FAST ENGINE AGAINST ZIPLINE
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Runs both strategies through zipline (with the optimize initialize functions) and the fast engine on a small fixed
+# dataset and checks the portfolio values, daily returns and alpha agree (see fast_engine.check_parity).
+# tests/data/parity/ holds synthetic daily bars for four indices from 2006 to 2009 - a rise, a 2008 style crash and a
+# recovery, with local holidays missing from each index and IMOEX.ME listed part way through - so both strategies
+# open and close positions. The files are fixed and are not touched by index_data or the price cache.
+
+import os
+import datetime as dt
+import pytz
+import pytest
+
+zipline = pytest.importorskip('zipline')  # parity is checked against zipline
+
+import backtest
+import price_cache
+import fast_engine
+
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'parity') + os.sep
+tickers = ['^GSPC', '^FTSE', '^N225', 'IMOEX.ME']
+start = dt.datetime(2007, 1, 1, 0, 0, 0, 0, pytz.utc)  # a year of history before the start for the signals
+end = dt.datetime(2009, 12, 31, 0, 0, 0, 0, pytz.utc)
+capital = 10000000
+
+
+@pytest.fixture
+def panel(monkeypatch, tmp_path):
+
+    monkeypatch.setattr(price_cache, 'enabled', False)  # read the fixture csv files directly
+    monkeypatch.chdir(tmp_path)  # check_parity writes its pickle files to the working directory
+
+    return backtest.format_data(tickers, csv_directory=data_directory)
+
+
+def test_multiple_positions_parity(panel):
+
+    parameters = {'correction_margin': 0.1, 'upturn_coefficient': 0.1, 'min_gain': -0.05, 'state_threshold': -10.0}
+
+    fast_engine.check_parity(start, end, capital, panel, tickers, parameters, multiple=True)
+
+
+def test_single_position_parity(panel):
+
+    parameters = {'correction_margin': 0.05, 'upturn_coefficient': 0.1, 'min_return': 0.05, 'min_gain': 0.07,
+                  'stop_loss': 0.53}
+
+    fast_engine.check_parity(start, end, capital, panel, tickers, parameters, multiple=False)
@@ -0,0 +1,71 @@
+# TESTS OF THE PRICE CACHE REBUILDING WHEN THE CLEANING CHANGES
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Cleaning (see data_cleaning) is only applied when the price cache is built, so the cache must be rebuilt when the
+# cleaning arguments or the data_cleaning source code change, not only when the csv files change
+
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_cleaning
+import price_cache
+
+
+tickers = ['^AAA', '^BBB']
+
+
+@pytest.fixture
+def csv_directory(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(price_cache, 'cache_directory', str(tmp_path / 'Price_cache') + '/')
+    monkeypatch.setattr(price_cache, 'cleaning', dict(price_cache.cleaning))  # tests change the cleaning arguments
+
+    directory = tmp_path / 'World_indices_data'
+    directory.mkdir()
+    dates = pd.Index(pd.bdate_range('2019-01-01', periods=20), name='Date')
+
+    for i, ticker in enumerate(tickers):
+        closes = np.linspace(100.0, 120.0, len(dates)) * (i + 1)
+        closes[10] *= 1.2  # one day spike of about 18% which is reversed the next day
+        data = pd.DataFrame({'Open': closes, 'High': closes * 1.01, 'Low': closes * 0.99, 'Close': closes,
+                             'Volume': 1000000}, index=dates)
+        data.to_csv(str(directory / '{}.csv'.format(ticker)))
+
+    return str(directory) + '/'
+
+
+def test_cache_is_current_after_build(csv_directory):
+
+    price_cache.load(tickers, csv_directory)
+
+    assert price_cache.is_current(tickers, csv_directory)
+
+
+def test_changing_a_cleaning_argument_rebuilds_the_cache(csv_directory):
+
+    spike = price_cache.load(tickers, csv_directory)['prices'][0, 10, data_cleaning.CLOSE]  # spike kept (max_spike 0.25)
+
+    price_cache.cleaning['max_spike'] = 0.1  # spikes of more than 10% are now clipped
+
+    assert not price_cache.is_current(tickers, csv_directory)
+
+    cleaned = price_cache.load(tickers, csv_directory)['prices'][0, 10, data_cleaning.CLOSE]
+
+    assert cleaned < spike
+    assert price_cache.is_current(tickers, csv_directory)
+
+
+def test_changing_the_cleaning_code_rebuilds_the_cache(csv_directory, tmp_path, monkeypatch):
+
+    price_cache.load(tickers, csv_directory)
+
+    changed_source = str(tmp_path / 'data_cleaning.py')
+    shutil.copy(data_cleaning.__file__, changed_source)
+    with open(changed_source, 'a') as handle:
+        handle.write('\n# changed\n')
+    monkeypatch.setattr(data_cleaning, '__file__', changed_source)
+
+    assert not price_cache.is_current(tickers, csv_directory)
@@ -0,0 +1,55 @@
+# TESTS OF THE RESULT STORE AND RESUMING CHECKPOINT LOGS
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Results of optimisations with and without pruning have different columns (see optimisers.store_result), so a
+# checkpoint log can only be resumed with the pruning setting it was written with and the store rejects ragged rows
+
+import datetime as dt
+import pytest
+
+import checkpoint_log
+import result_store
+
+
+parameters = {'correction_margin': 0.1, 'upturn_coefficient': 0.2}
+
+
+def test_store_rejects_rows_with_other_columns():
+
+    results = result_store.ResultStore(['mean_daily_return', 'alpha'] + list(parameters.keys()))
+    results.append(dict(parameters, mean_daily_return=0.001, alpha=0.1))
+
+    with pytest.raises(ValueError):
+        results.append(dict(parameters, mean_daily_return=0.002, alpha=0.2, pruned=False))  # extra column
+
+    with pytest.raises(ValueError):
+        results.append({'mean_daily_return': 0.002, 'alpha': 0.2})  # missing columns
+
+    assert len(results) == 1
+    assert results.to_dict() == {'mean_daily_return': [0.001], 'alpha': [0.1], 'correction_margin': [0.1],
+                                 'upturn_coefficient': [0.2]}
+
+
+def test_checkpoint_log_must_be_resumed_with_the_same_pruning(tmp_path):
+
+    start, end = dt.datetime(2000, 1, 1), dt.datetime(2004, 12, 31)
+    unpruned_path = str(tmp_path / 'unpruned.log')
+    pruned_path = str(tmp_path / 'pruned.log')
+
+    log = checkpoint_log.CheckpointLog(unpruned_path)
+    log.write(checkpoint_log.make_record(parameters, 0.001, 0.1, start, end))
+    log.close()
+
+    log = checkpoint_log.CheckpointLog(pruned_path)
+    log.write(checkpoint_log.make_record(parameters, 0.001, 0.1, start, end, pruned=False, checkpoint_returns=[0.1]))
+    log.close()
+
+    checkpoint_log.check_pruning(checkpoint_log.read_log(unpruned_path), pruning=False)
+    checkpoint_log.check_pruning(checkpoint_log.read_log(pruned_path), pruning=True)
+
+    with pytest.raises(ValueError):
+        checkpoint_log.check_pruning(checkpoint_log.read_log(unpruned_path), pruning=True)
+
+    with pytest.raises(ValueError):
+        checkpoint_log.check_pruning(checkpoint_log.read_log(pruned_path), pruning=False)
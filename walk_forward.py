@@ -0,0 +1,154 @@
+# WALK FORWARD OPTIMISATION OF MARKET CORRECTION STRATEGY PARAMETERS
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Parameters are optimised by exhaustive search on train_years of data and the best parameter set is backtested on
+# the following test_years (out of sample), rolling forward by test_years each fold. Folds are optimised concurrently
+# across a pool of processes which are each sent the data panel once. The out of sample returns of the folds are
+# stitched together into one equity curve.
+
+import pickle
+import os
+import shutil
+from datetime import datetime
+import pytz
+import numpy as np
+import pandas as pd
+import backtest
+import signals
+import optimisers
+
+
+# FUNCTION TO CREATE ROLLING FOLDS OF WHOLE YEARS - (train start, train end, test start, test end)
+def get_folds(first_year, last_year, train_years=5, test_years=1):
+
+    folds = []
+    year = first_year  # first year of the training timeframe
+
+    while year + train_years + test_years - 1 <= last_year:
+
+        train_start = datetime(year, 1, 1, 0, 0, 0, 0, pytz.utc)
+        train_end = datetime(year + train_years - 1, 12, 31, 0, 0, 0, 0, pytz.utc)
+        test_start = datetime(year + train_years, 1, 1, 0, 0, 0, 0, pytz.utc)
+        test_end = datetime(year + train_years + test_years - 1, 12, 31, 0, 0, 0, 0, pytz.utc)
+
+        folds.append((train_start, train_end, test_start, test_end))
+        year += test_years
+
+    return folds
+
+
+# FUNCTION TO OPTIMISE PARAMETERS ON THE TRAINING TIMEFRAME OF A FOLD AND BACKTEST THEM ON THE TEST TIMEFRAME
+# returns the best parameters, their in sample objective value and their out of sample daily returns
+def optimise_fold(fold, initial_capital, panel, market, multiple, objective):
+
+    train_start, train_end, test_start, test_end = fold
+
+    # in sample optimisation
+    results = optimisers.exhaustive_search(train_start, train_end, initial_capital, panel, multiple=multiple,
+                                           fast=market is not None, market=market)
+
+    scores = np.array(results[objective], dtype=float)
+    scores[np.isnan(scores)] = -np.inf
+    best = int(np.argmax(scores))  # row of best parameter set
+    parameters = {key: values[best] for key, values in results.items() if key not in ['mean_daily_return', 'alpha', 'pruned']}
+
+    # out of sample backtest
+    performance = optimisers.run_backtest(test_start, test_end, initial_capital, panel, parameters, multiple, market)
+
+    return parameters, results[objective][best], performance['returns']
+
+
+# FUNCTION TO OPTIMISE A (fold, initial capital, multiple, objective) TASK IN A WORKER PROCESS
+def fold_task(task):
+
+    fold, initial_capital, multiple, objective = task
+
+    return optimise_fold(fold, initial_capital, optimisers.worker_data['panel'], optimisers.worker_data['market'], multiple, objective)
+
+
+# FUNCTION TO RUN A WALK FORWARD OPTIMISATION
+# returns a dataframe of the timeframes, chosen parameters and returns of each fold and the stitched out of sample
+# equity curve (daily returns and portfolio value starting from initial_capital)
+def walk_forward(first_year, last_year, initial_capital, panel, train_years=5, test_years=1, multiple=True, fast=False, processes=1, objective='mean_daily_return'):
+
+    market = optimisers.load_market(panel) if fast else None  # prices and signals for the fast engine
+    folds = get_folds(first_year, last_year, train_years, test_years)
+    tasks = [(fold, initial_capital, multiple, objective) for fold in folds]
+
+    if processes > 1:  # optimise folds across processes, each process is sent the data once
+        pool, layout = optimisers.create_pool(processes, panel, market)
+        fold_results = pool.map(fold_task, tasks)
+        optimisers.close_pool(pool, layout)
+    else:
+        fold_results = [optimise_fold(fold, initial_capital, panel, market, multiple, objective) for fold in folds]
+
+    fold_rows = []  # timeframes, parameters and performance of each fold
+    test_returns = []  # out of sample daily returns of each fold
+
+    for fold, (parameters, in_sample_score, returns) in zip(folds, fold_results):
+
+        fold_row = {'train_start': fold[0].date(), 'train_end': fold[1].date(), 'test_start': fold[2].date(), 'test_end': fold[3].date(),
+                    'in_sample_' + objective: in_sample_score, 'out_of_sample_mean_daily_return': returns.mean(),
+                    'out_of_sample_return': (1 + returns).prod() - 1}
+        fold_row.update(parameters)
+        fold_rows.append(fold_row)
+        test_returns.append(returns)
+
+        print('Fold ' + str(fold[2].year) + ' ~ ' + str(fold[3].year) + ' out of sample return: ' + str(round(fold_row['out_of_sample_return'] * 100, 2)) + '%')
+
+    fold_df = pd.DataFrame(fold_rows)
+    fold_df = fold_df[['train_start', 'train_end', 'test_start', 'test_end', 'in_sample_' + objective,
+                       'out_of_sample_mean_daily_return', 'out_of_sample_return'] + sorted(parameters.keys())]
+
+    # stitch out of sample returns into one equity curve
+    returns = pd.concat(test_returns)
+    equity_curve = pd.DataFrame({'returns': returns, 'portfolio_value': initial_capital * (1 + returns).cumprod()})
+
+    return fold_df, equity_curve
+
+
+if __name__ == '__main__':
+
+    # List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
+    indices_tickers = ['^GSPC', '^DJI', '^IXIC', '^NYA', '^XAX', '^BUK100P', '^RUT', '^FTSE', '^GDAXI', '^FCHI',
+                       '^STOXX50E', '^N100', '^BFX', 'IMOEX.ME', '^N225', '^HSI', '000001.SS', '^STI', '^AXJO', '^AORD',
+                       '^BSESN', '^JKSE', '^KLSE', '^NZ50', '^KS11', '^TWII', '^GSPTSE', '^BVSP', '^MXX', '^IPSA',
+                       '^MERV', '^TA125.TA', '^CASE30', '^JN0U.JO']
+
+    # pickle tickers
+    with open('optimisation_tickers.pickle', 'wb') as handle:
+        pickle.dump(indices_tickers, handle)
+
+    panel = backtest.format_data(indices_tickers)  # format data once for all folds
+    print('Data formatted for Zipline')
+
+    signals.save_signals(panel, indices_tickers, 'optimisation_signals.pickle')  # calculate signals once for all folds
+    print('Signals calculated')
+
+    '''-------------------------- TIMEFRAME & CAPITAL ---------------------------'''
+    first_year = 2000  # first year of the first training timeframe
+    last_year = 2019  # last year of the last test timeframe
+    initial_capital = 10000000  # set starting capital for backtests
+
+    # directory for storing walk forward results
+    walk_forward_directory = 'Walk_forward_' + str(first_year) + '_~_' + str(last_year) + '_$' + str(initial_capital) + '/'
+
+    if not os.path.exists(walk_forward_directory):  # determine if walk forward has already been completed for given time
+        os.mkdir(walk_forward_directory)  # creates walk forward folder
+    else:
+        print('Walk forward already exists over given timeframe and capital base: ' + str(first_year) + ' ~ ' + str(last_year) + '  $' + str(initial_capital))
+        input('Press <ENTER> to continue and overwrite current walk forward for this timeframe and capital base...')
+        shutil.rmtree(walk_forward_directory)  # delete walk forward
+        os.mkdir(walk_forward_directory)  # creates walk forward folder
+
+    # RUN WALK FORWARD OPTIMISATION
+    fold_df, equity_curve = walk_forward(first_year, last_year, initial_capital, panel, train_years=5, test_years=1,
+                                         multiple=True, fast=False, processes=os.cpu_count())
+
+    fold_df.to_csv(walk_forward_directory + 'folds.csv', index=False)  # save chosen parameters of each fold
+    equity_curve.to_csv(walk_forward_directory + 'equity_curve.csv')  # save out of sample equity curve
+    print('Out of sample return: ' + str(round((equity_curve['portfolio_value'][-1] / initial_capital - 1) * 100, 2)) + '%')
+
+    os.remove('optimisation_tickers.pickle')  # delete tickers pickle file
+    os.remove('optimisation_signals.pickle')  # delete signals pickle file
@@ -0,0 +1,80 @@
+# ZIPLINE DATA BUNDLE OF THE WORLD INDICES DATA
+# AUTHORS: JOHN ALLEN - john@fortunefinancialtechnologies.co.uk &&&& PATRICK-JAMES PORTER - !!!!EMAIL!!!!
+# PROPERTY OF FORTUNE FINANCIAL TECHNOLOGIES - https://www.fortunefinancialtechnologies.co.uk
+
+# Registers the 'world-indices' bundle (importing this module registers it). Ingesting the bundle writes the cleaned
+# daily bars of the world indices tickers in World_indices_data/ (see backtest.format_data) to zipline's bcolz and SQLite
+# stores ONCE on the NYSE calendar, so backtests can pass bundle='world-indices' to zipline.run_algorithm and read the
+# bars from disk instead of building readers from a data panel on every run.
+# Bcolz stores prices to 3 decimal places and volumes as unsigned 32 bit integers (larger volumes are capped).
+#
+# TO INGEST THE BUNDLE USING COMMAND LINE INTERFACE (again after the index data is updated):
+# python world_indices_bundle.py
+
+import numpy as np
+import pandas as pd
+from zipline.data import bundles
+
+
+bundle_name = 'world-indices'  # name to pass as bundle to zipline.run_algorithm
+csv_directory = 'World_indices_data/'  # folder of ticker data (see backtest.format_data)
+calendar_name = 'NYSE'  # trading calendar of the bundle (the same calendar zipline uses for the data panel)
+
+# List of Major World Indices Yahoo tickers - https://finance.yahoo.com/world-indices
+# (in the same order as the backtests so the price cache built for them is reused, see price_cache)
+indices_tickers = ['^GSPC', '^DJI', '^IXIC', '^NYA', '^XAX', '^BUK100P', '^RUT', '^FTSE', '^GDAXI', '^FCHI',
+                   '^STOXX50E', '^N100', '^BFX', 'IMOEX.ME', '^N225', '^HSI', '000001.SS', '^STI', '^AXJO', '^AORD',
+                   '^BSESN', '^JKSE', '^KLSE', '^NZ50', '^KS11', '^TWII', '^GSPTSE', '^BVSP', '^MXX', '^IPSA',
+                   '^MERV', '^TA125.TA', '^CASE30', '^JN0U.JO']
+
+
+# FUNCTION TO WRITE THE INDEX DATA TO THE BUNDLE STORES (called by zipline when the bundle is ingested)
+def ingest(environ, asset_db_writer, minute_bar_writer, daily_bar_writer, adjustment_writer, calendar, start_session,
+           end_session, cache, show_progress, output_dir):
+
+    import backtest
+
+    tickers = indices_tickers
+    panel = backtest.format_data(tickers)  # cleaned data of all tickers
+    sessions = calendar.sessions_in_range(start_session, end_session)
+
+    assets = []  # start and end date of each ticker
+    sids = []  # asset id of each ticker written
+
+    # FUNCTION TO GENERATE (sid, daily bars) OF EACH TICKER ON THE SESSIONS BETWEEN ITS FIRST AND LAST BAR
+    def daily_bars():
+
+        for sid, ticker in enumerate(tickers):
+
+            bars = panel[ticker].reindex(sessions)  # bars on the calendar sessions (nan if no bar)
+            traded = bars.index[bars['close'].notnull()]
+            if len(traded) == 0:  # no data on the calendar sessions
+                continue
+            bars = bars.loc[traded[0]:traded[-1]]
+
+            bars['volume'] = bars['volume'].clip(upper=np.iinfo(np.uint32).max)  # largest volume bcolz can store
+            bars = bars.fillna(0)  # zero is read back by zipline as no bar
+
+            assets.append({'symbol': ticker,
+                           'asset_name': ticker,
+                           'start_date': traded[0],
+                           'end_date': traded[-1],
+                           'first_traded': traded[0],
+                           'auto_close_date': traded[-1] + pd.Timedelta(days=1),
+                           'exchange': 'YAHOO'})
+            sids.append(sid)
+
+            yield sid, bars
+
+    daily_bar_writer.write(daily_bars(), show_progress=show_progress, invalid_data_behavior='ignore')
+    asset_db_writer.write(equities=pd.DataFrame(assets, index=sids))
+    adjustment_writer.write()  # indices have no splits or dividends
+
+
+bundles.register(bundle_name, ingest, calendar_name=calendar_name)
+
+
+if __name__ == '__main__':
+
+    bundles.ingest(bundle_name, show_progress=True)
+    print('Bundle ingested: ' + bundle_name)